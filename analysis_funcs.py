@@ -1,134 +1,446 @@
+import os
 import json
 import collections
 import zlib
+import bz2
+import lzma
+import functools
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
+import scipy.sparse
 import seaborn as sns
 import matplotlib.pyplot as plt
 from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.metrics.pairwise import manhattan_distances as pairwise_manhattan_distances
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.cluster import KMeans
+from sklearn.cluster import KMeans, MiniBatchKMeans, AgglomerativeClustering, HDBSCAN, SpectralClustering
+from scipy.sparse.csgraph import minimum_spanning_tree, connected_components
 from scipy.optimize import linear_sum_assignment
 from sklearn.metrics import f1_score, precision_score, recall_score
+from corpus import Corpus
 
-def run_analysis(data_file):
-    """main function to run the analysis"""
-    # Load in data
-    with open(data_file, 'r') as f:
-        test_data = json.load(f)
-    
-    # Convert JSON steps into strings
-    step_definition_strings = stringify_test_cases(test_data, "step_definition")
-    step_name_strings = stringify_test_cases(test_data, "step_name")
-    step_name_clean_strings = stringify_test_cases(test_data, "step_name_cleaned")
-    scenario_nums, scenario_title_strings = stringify_test_titles(test_data)
+# Step fields behind each view of run_analysis, the scenario titles are the "title" view
+VIEW_KEYS = {"Step Name": "step_name", "Step Name Cleaned": "step_name_cleaned", "Step Definition": "step_definition",
+             "Scenario Title": "title"}
+# Size of the neighbour graph the precomputed backends cluster by default in run_analysis and evaluation.evaluate
+DEFAULT_NEIGHBOURS = 10
+# The measure name of the rows that cluster a view's TF-IDF features directly ("minibatch")
+FEATURES_MEASURE = "TF-IDF"
 
-    # Calculate matrices for each metric
-    matrices = {
-        "Step Name NCD": calculate_pairwise_ncd(step_name_strings),
-        "Step Name Cleaned NCD": calculate_pairwise_ncd(step_name_clean_strings),
-        "Step Definition NCD": calculate_pairwise_ncd(step_definition_strings),
-        "Scenario Title NCD": calculate_pairwise_ncd(scenario_title_strings),
-        "Step Name Cosine": calculate_cosine_similarity(step_name_strings),
-        "Step Name Cleaned Cosine": calculate_cosine_similarity(step_name_clean_strings),
-        "Step Definition Cosine": calculate_cosine_similarity(step_definition_strings),
-        "Scenario Title Cosine": calculate_cosine_similarity(scenario_title_strings),
-        "Step Name Euclidean": calculate_euclidean_distance(step_name_strings),
-        "Step Name Cleaned Euclidean": calculate_euclidean_distance(step_name_clean_strings),
-        "Step Definition Euclidean": calculate_euclidean_distance(step_definition_strings),
-        "Scenario Title Euclidean": calculate_euclidean_distance(scenario_title_strings),
-        "Step Name Manhattan": calculate_manhattan_distance(step_name_strings),
-        "Step Name Cleaned Manhattan": calculate_manhattan_distance(step_name_clean_strings),
-        "Step Definition Manhattan": calculate_manhattan_distance(step_definition_strings),
-        "Scenario Title Manhattan": calculate_manhattan_distance(scenario_title_strings)
-    }
+def run_analysis(data_file, compressor="zlib", level=None, feature_cache_dir=None, backend="kmeans", neighbours=DEFAULT_NEIGHBOURS):
+    """
+    main function to run the analysis
+
+    Args:
+        data_file (str): The parsed steps file (.json or .jsonl).
+        compressor (str or callable): The NCD compression backend, see make_compressor.
+        level (int): The compression level of the NCD backend.
+        feature_cache_dir (str): Optional directory to save fitted TF-IDF matrices for later runs.
+        backend (str): The clustering backend, see cluster_labels. "minibatch" clusters the TF-IDF
+                       features of each view once instead of the 16 matrices.
+        neighbours (int): The agglomerative, hdbscan and spectral backends cluster the top-k neighbour
+                          graph of each matrix (DEFAULT_NEIGHBOURS). 0 or None gives them the whole matrix.
+    """
+    test_data, views = load_views(data_file)
+    step_name_strings = views["Step Name"]
+    step_name_clean_strings = views["Step Name Cleaned"]
+    step_definition_strings = views["Step Definition"]
+    scenario_title_strings = views["Scenario Title"]
+
+    # Fit TF-IDF once per view and share it between the cosine, Euclidean and Manhattan metrics
+    feature_cache = TfidfFeatureCache(feature_cache_dir)
 
     # Determine number of clusters
     num_clusters = len(set([test['feature_file'] for test in test_data]))
-    true_cluster_labels = true_clusters(test_data)
+    true_labels, true_keys = true_cluster_labels(test_data)
 
-    # Process each matrix, plot data and list metrics
     metrics = {}
+    if backend == "minibatch":
+        # Mini-Batch K-Means clusters the TF-IDF features of the view, which are the same for every
+        # measure, so each view is clustered once and none of the n x n matrices are computed
+        for view, test_strings in views.items():
+            predicted_labels = cluster_labels(num_clusters, backend, features=feature_cache.matrix(test_strings))
+            metrics[f"{view} {FEATURES_MEASURE}"] = cluster_scores(true_labels, predicted_labels, true_keys)
+            print_scores(f"{view} {FEATURES_MEASURE}", metrics[f"{view} {FEATURES_MEASURE}"])
+        return metrics
+
+    # Calculate matrices for each metric
+    matrices = {
+        "Step Name NCD": calculate_pairwise_ncd(step_name_strings, compressor=compressor, level=level),
+        "Step Name Cleaned NCD": calculate_pairwise_ncd(step_name_clean_strings, compressor=compressor, level=level),
+        "Step Definition NCD": calculate_pairwise_ncd(step_definition_strings, compressor=compressor, level=level),
+        "Scenario Title NCD": calculate_pairwise_ncd(scenario_title_strings, compressor=compressor, level=level),
+        "Step Name Cosine": calculate_cosine_similarity(step_name_strings, feature_cache),
+        "Step Name Cleaned Cosine": calculate_cosine_similarity(step_name_clean_strings, feature_cache),
+        "Step Definition Cosine": calculate_cosine_similarity(step_definition_strings, feature_cache),
+        "Scenario Title Cosine": calculate_cosine_similarity(scenario_title_strings, feature_cache),
+        "Step Name Euclidean": calculate_euclidean_distance(step_name_strings, feature_cache),
+        "Step Name Cleaned Euclidean": calculate_euclidean_distance(step_name_clean_strings, feature_cache),
+        "Step Definition Euclidean": calculate_euclidean_distance(step_definition_strings, feature_cache),
+        "Scenario Title Euclidean": calculate_euclidean_distance(scenario_title_strings, feature_cache),
+        "Step Name Manhattan": calculate_manhattan_distance(step_name_strings, feature_cache),
+        "Step Name Cleaned Manhattan": calculate_manhattan_distance(step_name_clean_strings, feature_cache),
+        "Step Definition Manhattan": calculate_manhattan_distance(step_definition_strings, feature_cache),
+        "Scenario Title Manhattan": calculate_manhattan_distance(scenario_title_strings, feature_cache)
+    }
+
+    # Process each matrix, plot data and list metrics
     for matrix_name, matrix in matrices.items():
-        aligned_clusters, precision, mean_avg_precision, mean_reciprocal_ranks = plot_and_cluster(
-            matrix, matrix_name, num_clusters, scenario_title_strings, true_cluster_labels
-        )
-        metrics[matrix_name] = (aligned_clusters, precision, mean_avg_precision, mean_reciprocal_ranks)
+        similarity = matrix_name.endswith(" Cosine")
+        graph = None
+        if neighbours and backend in PRECOMPUTED_BACKENDS:
+            # cluster the sparse top-k neighbour graph rather than the dense matrix
+            graph = matrix_neighbour_graph(matrix, neighbours, similarity)
+        metrics[matrix_name] = plot_and_cluster(matrix, matrix_name, num_clusters, true_labels, true_keys,
+                                                backend, similarity=similarity, graph=graph)
 
-def plot_and_cluster(matrix, matrix_name, num_clusters, scenario_titles, true_clusters):
+    return metrics
+
+def load_views(data_file):
+    """
+    Stream in the data as a Corpus and join the string of every view.
+
+    Only the interned corpus and the fields needed for the true clusters are kept.
+
+    Returns:
+        tuple: The test cases without their steps, and a dict of view name -> list of strings.
     """
-    Plot heatmap, perform k-means clustering, and compute similarity metrics.
+    corpus = Corpus.from_test_cases(read_test_cases(data_file))
+    views = {view: corpus.view(data_key) for view, data_key in VIEW_KEYS.items()}
+    return corpus.scenarios(), views
+
+def plot_and_cluster(matrix, matrix_name, num_clusters, true_labels, true_keys=None, backend="kmeans", similarity=False, features=None, graph=None):
+    """
+    Plot heatmap, cluster the scenarios, and compute similarity metrics.
+
+    Args:
+        matrix (array): The similarity or distance matrix of the scenarios.
+        matrix_name (str): The name of the metric, used for the plot title and the printed metrics.
+        num_clusters (int): The number of clusters to look for.
+        true_labels (array): The true cluster of each scenario, see true_cluster_labels.
+        true_keys (list): The name of each true cluster, used for the aligned clusters.
+        backend (str): The clustering backend, see cluster_labels.
+        similarity (bool): Whether the matrix holds similarities rather than distances.
+        features (sparse matrix): The feature vectors of the scenarios, used by "minibatch".
+        graph (sparse matrix): Optional top-k neighbour graph for the precomputed backends.
+
+    Returns:
+        dict: The scores of the clustering, see cluster_scores.
     """
     # Plot heatmap
     plot_individual_heatmap(matrix, title=f"{matrix_name} Heatmap")
 
-    # Perform k-means clustering
-    predicted_clusters = kmeans_clustering(matrix, num_clusters, scenario_titles)
+    # Cluster the scenarios
+    predicted_labels = cluster_labels(num_clusters, backend, matrix, similarity, features, graph)
 
     # Calculate similarity metrics
-    aligned_clusters, precision, mean_avg_precision, mean_reciprocal_ranks = cluster_similarity(true_clusters, predicted_clusters)
+    scores = cluster_scores(true_labels, predicted_labels, true_keys)
 
-    # Print metrics
+    print_scores(matrix_name, scores)
+    return scores
+
+def print_scores(matrix_name, scores):
+    """Print the scores of a clustering, see cluster_scores."""
     print(f"{matrix_name} Metrics:")
-    print(f"  Precision: {precision:.4f}")
-    print(f"  Mean Average Precision: {mean_avg_precision:.4f}")
-    print(f"  Mean Reciprocal Ranks: {mean_reciprocal_ranks:.4f}")
+    print(f"  Precision: {scores['precision']:.4f}")
+    print(f"  Mean Average Precision: {scores['map']:.4f}")
+    print(f"  Mean Reciprocal Ranks: {scores['mrr']:.4f}")
+    print(f"  Adjusted Rand Index: {scores['ari']:.4f}")
+    print(f"  Normalized Mutual Information: {scores['nmi']:.4f}")
     print()
 
-    return aligned_clusters, precision, mean_avg_precision, mean_reciprocal_ranks
+def encode_labels(values):
+    """
+    Encode a sequence of hashable values as integer codes, in order of first appearance.
+
+    Returns:
+        tuple: The code of each value as an int array, and the distinct values in code order.
+    """
+    codes = {}
+    encoded = np.fromiter((codes.setdefault(value, len(codes)) for value in values), dtype=np.intp, count=len(values))
+    return encoded, list(codes)
+
+def contingency_table(true_labels, predicted_labels):
+    """
+    Count the scenarios of every (true cluster, predicted cluster) pair in a single bincount.
+
+    Args:
+        true_labels (array): The true cluster code of each scenario, 0..T-1.
+        predicted_labels (array): The predicted cluster code of each scenario, 0..P-1.
+
+    Returns:
+        array: The T x P table of overlaps.
+    """
+    num_true = int(true_labels.max()) + 1
+    num_predicted = int(predicted_labels.max()) + 1
+    counts = np.bincount(true_labels * num_predicted + predicted_labels, minlength=num_true * num_predicted)
+    return counts.reshape(num_true, num_predicted)
+
+def pair_count(counts):
+    """Number of unordered pairs within each count, n choose 2."""
+    counts = counts.astype(np.float64)
+    return counts * (counts - 1) / 2
+
+def adjusted_rand_index(table):
+    """Compute the adjusted Rand index of a clustering from its contingency table."""
+    total_pairs = pair_count(np.asarray(table.sum()))
+    index = pair_count(table).sum()
+    true_pairs = pair_count(table.sum(axis=1)).sum()
+    predicted_pairs = pair_count(table.sum(axis=0)).sum()
+    if total_pairs == 0:
+        return 1.0
+    expected_index = true_pairs * predicted_pairs / total_pairs
+    max_index = (true_pairs + predicted_pairs) / 2
+    if max_index == expected_index:
+        # both clusterings are all singletons or a single cluster
+        return 1.0
+    return float((index - expected_index) / (max_index - expected_index))
+
+def normalized_mutual_information(table):
+    """Compute the normalized mutual information (arithmetic mean normalization) from a contingency table."""
+    total = table.sum()
+    true_sizes = table.sum(axis=1)
+    predicted_sizes = table.sum(axis=0)
+    true_entropy = entropy(true_sizes, total)
+    predicted_entropy = entropy(predicted_sizes, total)
+    if true_entropy == 0 and predicted_entropy == 0:
+        return 1.0
+
+    rows, columns = np.nonzero(table)
+    overlaps = table[rows, columns].astype(np.float64)
+    mutual_information = np.sum(overlaps / total * np.log(overlaps * total / (true_sizes[rows] * predicted_sizes[columns])))
+    mutual_information = max(float(mutual_information), 0.0)
+    return mutual_information / ((true_entropy + predicted_entropy) / 2)
+
+def entropy(sizes, total):
+    """Entropy of a clustering given the size of each cluster."""
+    probabilities = sizes[sizes > 0] / total
+    return float(-np.sum(probabilities * np.log(probabilities)))
+
+def cluster_scores(true_labels, predicted_labels, true_keys=None):
+    """
+    Score predicted clusters against the true clusters using integer label arrays.
+
+    Predicted clusters are aligned to the true clusters with the Hungarian algorithm on the
+    contingency table. A scenario is correct if its predicted cluster is the one aligned to its
+    true cluster. The reciprocal rank of a scenario is 1 / (predicted cluster + 1), as in the
+    original title based scoring.
+
+    Args:
+        true_labels (array): The true cluster of each scenario, e.g. from true_cluster_labels.
+        predicted_labels (array): The predicted cluster of each scenario, e.g. KMeans labels.
+        true_keys (list): Optional name of each true cluster, used in the aligned clusters.
+
+    Returns:
+        dict: The aligned (true cluster, predicted cluster) matches, precision, MAP, MRR, ARI and NMI.
+    """
+    true_labels = np.asarray(true_labels, dtype=np.intp)
+    predicted_keys, predicted_codes = np.unique(np.asarray(predicted_labels), return_inverse=True)
+    predicted_codes = predicted_codes.reshape(-1)
+
+    table = contingency_table(true_labels, predicted_codes)
+
+    # Apply the Hungarian algorithm to find the optimal assignment
+    row_ind, col_ind = linear_sum_assignment(-table)
+    # true clusters left without a predicted cluster (more true than predicted clusters) get -1
+    assigned = np.full(table.shape[0], -1, dtype=np.intp)
+    assigned[row_ind] = col_ind
+
+    correct = predicted_codes == assigned[true_labels]
+    true_sizes = np.bincount(true_labels, minlength=table.shape[0])
+    true_correct = np.bincount(true_labels, weights=correct, minlength=table.shape[0])
+    present = true_sizes > 0
+    reciprocal_ranks = 1 / (predicted_keys[predicted_codes].astype(np.float64) + 1)
+
+    if true_keys is None:
+        true_keys = list(range(table.shape[0]))
+    matches = [(true_keys[i], predicted_keys[j].item()) for i, j in zip(row_ind, col_ind)]
+
+    return {
+        "matches": matches,
+        "precision": float(correct.mean()),
+        "map": float(np.mean(true_correct[present] / true_sizes[present])),
+        "mrr": float(reciprocal_ranks.mean()),
+        "ari": adjusted_rand_index(table),
+        "nmi": normalized_mutual_information(table),
+    }
 
 def cluster_similarity(true_clusters, predicted_clusters):
+    """
+    Score predicted clusters against the true clusters, both given as cluster -> scenario titles.
+
+    Scenarios are matched by title, so scenarios sharing a title are scored as the last one seen
+    in predicted_clusters. Use cluster_scores with label arrays to score every scenario.
+
+    Returns:
+        tuple: The aligned clusters, precision, mean average precision and mean reciprocal rank.
+    """
     true_keys = list(true_clusters.keys())
-    pred_keys = list(predicted_clusters.keys())
-    
-    overlap_matrix = np.zeros((len(true_keys), len(pred_keys)))
-    
-    for i, true_key in enumerate(true_keys):
-        true_values = set(true_clusters[true_key])
-        for j, pred_key in enumerate(pred_keys):
-            pred_values = set(predicted_clusters[pred_key])
-            overlap = true_values & pred_values
-            overlap_matrix[i, j] = len(overlap)
-    
-    cost_matrix = -overlap_matrix
-    
-    # Apply the Hungarian algorithm to find the optimal assignment
-    row_ind, col_ind = linear_sum_assignment(cost_matrix)
-    
-    i = 0
-    total_correct = 0
-    total_scenarios = 0
-    average_precisions = []
-    reciprocal_ranks = []
-    for true_key, true_labels in true_clusters.items():
-        cur_correct = 0
-        pred_cluster_index = col_ind[i]
-        pred_labels = set(predicted_clusters[pred_cluster_index])
-
-        for label in true_labels:
-            total_scenarios += 1
-            if label in pred_labels:
-                total_correct += 1
-                cur_correct += 1
-            
-            for pred_key, pred_labels in predicted_clusters.items():
-                if label in pred_labels:
-                    reciprocal_ranks.append(1/(pred_key+1))
+    predicted_by_title = {title: pred_key for pred_key, titles in predicted_clusters.items() for title in titles}
 
-        average_precisions.append(cur_correct/len(true_labels))
+    true_labels = []
+    predicted_labels = []
+    for i, titles in enumerate(true_clusters.values()):
+        for title in titles:
+            if title in predicted_by_title:
+                true_labels.append(i)
+                predicted_labels.append(predicted_by_title[title])
 
-    
-    precision = total_correct/total_scenarios
-    mean_average_precision = np.mean(average_precisions)
-    matches = [(true_keys[i], pred_keys[j]) for i, j in zip(row_ind, col_ind)] 
-    mean_reciprocal_ranks = np.mean(reciprocal_ranks)
+    scores = cluster_scores(true_labels, predicted_labels, true_keys)
+    return scores["matches"], scores["precision"], scores["map"], scores["mrr"]
 
-    return matches, precision, mean_average_precision, mean_reciprocal_ranks
+def kmeans_labels(matrix, num_clusters):
+    """Perform K-Means clustering and return the cluster label of each row."""
+    kmeans = KMeans(n_clusters=num_clusters, random_state=42)
+    kmeans.fit(matrix)
+    return kmeans.labels_
+
+def minibatch_kmeans_labels(features, num_clusters, batch_size=1024):
+    """
+    Perform Mini-Batch K-Means on the feature vectors (e.g. the sparse TF-IDF matrix) of the scenarios.
+
+    Unlike kmeans_labels on an n x n matrix, the cost grows linearly with the number of scenarios.
+    """
+    kmeans = MiniBatchKMeans(n_clusters=num_clusters, batch_size=batch_size, n_init=3, random_state=42)
+    kmeans.fit(features)
+    return kmeans.labels_
+
+def precomputed_distances(matrix, similarity=False):
+    """
+    Convert a similarity or distance matrix into the symmetric distances the precomputed backends expect.
+
+    Dense matrices get a zero diagonal. Sparse graphs keep only their stored entries, and zero
+    distances are raised to a tiny positive value so duplicate scenarios stay connected.
+    """
+    if scipy.sparse.issparse(matrix):
+        distances = scipy.sparse.csr_matrix(matrix, dtype=np.float64, copy=True)
+        if similarity:
+            distances.data = 1 - distances.data
+        distances.data = np.maximum(distances.data, 1e-10)
+        return distances.maximum(distances.T).tocsr()
+
+    distances = 1 - matrix if similarity else np.array(matrix, dtype=np.float64)
+    distances = np.maximum((distances + distances.T) / 2, 0)
+    np.fill_diagonal(distances, 0)
+    return distances
+
+def precomputed_affinities(matrix, similarity=False):
+    """
+    Convert a similarity or distance matrix into non-negative symmetric affinities for spectral clustering.
+
+    Distances are mapped through a Gaussian kernel scaled by their median.
+    """
+    sparse = scipy.sparse.issparse(matrix)
+    affinities = scipy.sparse.csr_matrix(matrix, dtype=np.float64, copy=True) if sparse else np.array(matrix, dtype=np.float64)
+    values = affinities.data if sparse else affinities
+    if similarity:
+        np.maximum(values, 0, out=values)
+    else:
+        scale = np.median(values[values > 0]) if np.any(values > 0) else 1.0
+        values[...] = np.exp(-(values / scale) ** 2 / 2)
+
+    if sparse:
+        return affinities.maximum(affinities.T).tocsr()
+    return (affinities + affinities.T) / 2
+
+def agglomerative_labels(distances, num_clusters):
+    """
+    Perform agglomerative clustering on precomputed distances.
+
+    A dense matrix is clustered with average linkage. A sparse top-k graph is clustered with single
+    linkage restricted to its edges: the minimum spanning forest is cut at its num_clusters - 1
+    longest edges, so only the O(n * k) stored distances are used.
+    """
+    if not scipy.sparse.issparse(distances):
+        clustering = AgglomerativeClustering(n_clusters=num_clusters, metric="precomputed", linkage="average")
+        return clustering.fit(distances).labels_
+
+    forest = minimum_spanning_tree(distances).tocoo()
+    num_components = connected_components(distances, directed=False)[0]
+    # a graph with several components is already split, so fewer edges need cutting
+    num_cuts = min(max(num_clusters - num_components, 0), forest.nnz)
+    keep = np.argsort(forest.data, kind='stable')[:forest.nnz - num_cuts]
+    forest = scipy.sparse.coo_matrix((forest.data[keep], (forest.row[keep], forest.col[keep])), shape=forest.shape)
+    return connected_components(forest, directed=False)[1]
+
+def hdbscan_labels(distances, min_cluster_size=2):
+    """
+    Perform HDBSCAN on precomputed distances, dense or a sparse top-k graph.
+
+    HDBSCAN picks the number of clusters itself. Each noise point is given a cluster of its own,
+    so every scenario has a predicted cluster to score. HDBSCAN needs a connected graph, so each
+    connected component of a sparse graph is clustered separately.
+    """
+    if scipy.sparse.issparse(distances):
+        num_components, components = connected_components(distances, directed=False)
+    else:
+        num_components, components = 1, np.zeros(distances.shape[0], dtype=np.intp)
+
+    labels = np.full(distances.shape[0], -1, dtype=np.intp)
+    for component in range(num_components):
+        members = np.flatnonzero(components == component)
+        start = labels.max() + 1
+        if len(members) <= min_cluster_size:
+            # too small to split, so the component is a cluster of its own
+            labels[members] = start
+            continue
+        component_distances = distances[members][:, members] if num_components > 1 else distances
+        clustering = HDBSCAN(min_cluster_size=min_cluster_size, metric="precomputed", copy=True)
+        component_labels = clustering.fit(component_distances).labels_
+        labels[members] = np.where(component_labels < 0, -1, component_labels + start)
+
+    noise = labels < 0
+    labels[noise] = labels.max() + 1 + np.arange(np.count_nonzero(noise))
+    return labels
+
+def spectral_labels(affinities, num_clusters):
+    """Perform spectral clustering on a precomputed affinity matrix, dense or a sparse top-k graph."""
+    clustering = SpectralClustering(n_clusters=num_clusters, affinity="precomputed", random_state=42)
+    return clustering.fit(affinities).labels_
+
+CLUSTERING_BACKENDS = ("kmeans", "minibatch", "agglomerative", "hdbscan", "spectral")
+# Backends that cluster a precomputed matrix, and so can be given a sparse neighbour graph instead
+PRECOMPUTED_BACKENDS = ("agglomerative", "hdbscan", "spectral")
+
+def cluster_labels(num_clusters, backend="kmeans", matrix=None, similarity=False, features=None, graph=None):
+    """
+    Cluster the scenarios with one of CLUSTERING_BACKENDS and return the cluster label of each scenario.
+
+    Args:
+        num_clusters (int): The number of clusters to look for. Ignored by "hdbscan".
+        backend (str): "kmeans" clusters the rows of the matrix, "minibatch" the features, and
+                       "agglomerative", "hdbscan" and "spectral" the precomputed matrix or graph.
+        matrix (array): The dense n x n similarity or distance matrix.
+        similarity (bool): Whether the matrix and graph hold similarities (e.g. cosine) rather than distances.
+        features (sparse matrix): The feature vectors of the scenarios, e.g. their TF-IDF matrix.
+                                  "minibatch" falls back to the rows of the matrix without them.
+        graph (sparse matrix): A top-k neighbour graph, see neighbour_graph. Used instead of the
+                               matrix by the precomputed backends when given.
+
+    Returns:
+        array: The predicted cluster of each scenario.
+    """
+    if backend not in CLUSTERING_BACKENDS:
+        raise ValueError(f"Unknown clustering backend {backend!r}, expected one of {CLUSTERING_BACKENDS}.")
+
+    if backend == "kmeans":
+        return kmeans_labels(matrix, num_clusters)
+    if backend == "minibatch":
+        return minibatch_kmeans_labels(features if features is not None else matrix, num_clusters)
+
+    precomputed = graph if graph is not None else matrix
+    if precomputed is None:
+        raise ValueError(f"The {backend!r} backend needs a matrix or a neighbour graph.")
+    if backend == "agglomerative":
+        return agglomerative_labels(precomputed_distances(precomputed, similarity), num_clusters)
+    if backend == "hdbscan":
+        return hdbscan_labels(precomputed_distances(precomputed, similarity))
+    return spectral_labels(precomputed_affinities(precomputed, similarity), num_clusters)
 
 def kmeans_clustering(matrix, num_clusters, labels):
     """Perform K-Means clustering and return the clusters."""
-    kmeans = KMeans(n_clusters=num_clusters, random_state=42)
-    kmeans.fit(matrix)
-    cluster_labels = kmeans.labels_
+    cluster_labels = kmeans_labels(matrix, num_clusters)
     
     clusters = {}
     for idx, label in enumerate(cluster_labels):
@@ -158,6 +470,15 @@ def true_clusters(test_data):
     
     return clusters
 
+def true_cluster_labels(test_data):
+    """
+    Encode the feature file of each test case as its true cluster.
+
+    Returns:
+        tuple: The true cluster of each test case as an int array, and the feature file of each cluster.
+    """
+    return encode_labels([test["feature_file"] for test in test_data])
+
 def calculate_ncd(data1, data2):
     if not data1 or not data2:
         raise ValueError("Input data strings must not be empty.")
@@ -175,14 +496,33 @@ def calculate_ncd(data1, data2):
     
     return (len(compressed_combined) - min(len_compressed1, len_compressed2)) / combined_length
 
+def read_test_cases(data_file):
+    """
+    Yield the test cases of a parsed steps file one at a time.
+
+    JSON Lines files (.jsonl) are read line by line, so the whole file is never loaded at once.
+    Other files are read as a single JSON array.
+    """
+    with open(data_file, 'r') as f:
+        if data_file.endswith('.jsonl'):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from json.load(f)
+
+def stringify_test_case(test_case, data_key):
+    """Convert the steps or glue code of a single test case into a string"""
+    step_name_string = ""
+    for step in test_case["steps"]:
+        step_name_string += f"{step['step_num']}: {step[data_key]}\n"
+    return step_name_string
+
 def stringify_test_cases(test_data, data_key):
     """Convert the steps and glue code into strings"""
     test_strings = []
     for test_case in test_data:
-        step_name_string = ""
-        for step in test_case["steps"]:
-            step_name_string += f"{step['step_num']}: {step[data_key]}\n"
-        test_strings.append(step_name_string)
+        test_strings.append(stringify_test_case(test_case, data_key))
     
     return test_strings
 
@@ -195,69 +535,413 @@ def stringify_test_titles(test_data):
         test_titles.append(test["test_case"])
     return test_nums, test_titles
 
-def calculate_pairwise_ncd(test_strings):
+NCD_COMPRESSORS = ("zlib", "bz2", "lzma", "zlib-dict")
+
+# Compressors already primed with a dictionary, copied for each string instead of re-priming
+primed_compressors = {}
+
+def compress_with_dictionary(data, zdict, level):
+    """Raw deflate (no zlib header or checksum) primed with a preset dictionary."""
+    key = (zdict, level)
+    if key not in primed_compressors:
+        primed_compressors[key] = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=zdict)
+    compressor = primed_compressors[key].copy()
+    return compressor.compress(data) + compressor.flush()
+
+def build_compression_dictionary(test_strings, max_size=32768):
+    """
+    Build a zlib preset dictionary from the most common lines of the corpus.
+
+    The most common lines go last, since deflate can reference the end of the dictionary with the shortest distances.
+    """
+    line_counts = collections.Counter(line for string in test_strings for line in string.splitlines() if line)
+    dictionary = b""
+    for line, count in line_counts.most_common():
+        if count < 2:
+            break
+        encoded = line.encode() + b"\n"
+        if len(dictionary) + len(encoded) > max_size:
+            break
+        dictionary = encoded + dictionary
+    return dictionary
+
+def make_compressor(compressor="zlib", level=None, test_strings=None):
+    """
+    Return a picklable function that compresses bytes with the chosen backend.
+
+    Args:
+        compressor (str or callable): "zlib", "bz2", "lzma", "zlib-dict" or a function taking and returning bytes.
+        level (int): Compression level for zlib, zlib-dict (0-9) and bz2 (1-9), or the lzma preset (0-9).
+                     None uses each library's default.
+        test_strings (list): The corpus used to build the "zlib-dict" dictionary.
+    """
+    if callable(compressor):
+        return compressor
+    if compressor == "zlib":
+        return zlib.compress if level is None else functools.partial(zlib.compress, level=level)
+    if compressor == "bz2":
+        return bz2.compress if level is None else functools.partial(bz2.compress, compresslevel=level)
+    if compressor == "lzma":
+        return lzma.compress if level is None else functools.partial(lzma.compress, preset=level)
+    if compressor == "zlib-dict":
+        if test_strings is None:
+            raise ValueError("The zlib-dict compressor needs the corpus to build its dictionary.")
+        zdict = build_compression_dictionary(test_strings)
+        return functools.partial(compress_with_dictionary, zdict=zdict, level=zlib.Z_DEFAULT_COMPRESSION if level is None else level)
+    raise ValueError(f"Unknown compressor {compressor!r}, expected one of {NCD_COMPRESSORS}.")
+
+# Encoded strings, their compressed lengths and the compressor, set once per NCD worker process
+ncd_worker_data = None
+
+def init_ncd_worker(encoded_strings, compressed_lengths, compress=zlib.compress):
+    """Store the encoded strings, their compressed lengths and the compressor in the worker process."""
+    global ncd_worker_data
+    ncd_worker_data = (encoded_strings, compressed_lengths, compress)
+
+def ncd_row(i, columns):
+    """Calculate the NCD between string i and each string in columns."""
+    encoded_strings, compressed_lengths, compress = ncd_worker_data
+    row = np.full(len(columns), float('inf'))
+    if compressed_lengths[i] is not None:
+        for offset, j in enumerate(columns):
+            if compressed_lengths[j] is None:
+                continue
+            # concatenate in index order so NCD(i, j) == NCD(j, i) like the symmetric matrix
+            first, second = (i, j) if i < j else (j, i)
+            combined = len(compress(encoded_strings[first] + encoded_strings[second]))
+            row[offset] = (combined - min(compressed_lengths[i], compressed_lengths[j])) / (compressed_lengths[i] + compressed_lengths[j])
+    return row
+
+def ncd_rows(row_range):
+    """Calculate the upper triangle NCD values for a block of rows."""
+    start, stop = row_range
+    num_strings = len(ncd_worker_data[0])
+    rows = [ncd_row(i, range(i + 1, num_strings)) for i in range(start, stop)]
+    return start, rows
+
+def ncd_top_k(block):
+    """Calculate the full NCD rows of a block and keep only the k nearest of each row."""
+    start, stop, k = block
+    num_strings = len(ncd_worker_data[0])
+    distances = np.array([ncd_row(i, range(num_strings)) for i in range(start, stop)])
+    return top_k_smallest(distances, k, start)
+
+def ncd_row_blocks(num_strings, num_blocks):
+    """Split the rows into blocks with roughly the same number of upper triangle pairs."""
+    total_pairs = num_strings * (num_strings - 1) // 2
+    target = max(1, total_pairs // max(1, num_blocks))
+    blocks = []
+    start = 0
+    pairs = 0
+    for i in range(num_strings):
+        pairs += num_strings - i - 1
+        if pairs >= target:
+            blocks.append((start, i + 1))
+            start = i + 1
+            pairs = 0
+    if start < num_strings:
+        blocks.append((start, num_strings))
+    return blocks
+
+def compress_strings(test_strings, compress):
+    """Encode each string and compress it once, recording None for empty strings."""
+    encoded_strings = [string.encode() for string in test_strings]
+    compressed_lengths = []
+    for i, encoded in enumerate(encoded_strings):
+        if not encoded:
+            print(f"Error calculating NCD for string {i}: Input data strings must not be empty.")
+            compressed_lengths.append(None)
+        else:
+            compressed_lengths.append(len(compress(encoded)))
+    return encoded_strings, compressed_lengths
+
+def calculate_pairwise_ncd(test_strings, workers=None, compressor="zlib", level=None):
+    """
+    Calculate the NCD between every pair of strings.
+
+    Each string is encoded and compressed once, only the upper triangle of concatenated pairs is
+    compressed, and blocks of rows are spread over a process pool. Pairs with an empty string are inf.
+
+    Args:
+        test_strings (list): The strings to compare.
+        workers (int): Number of processes to use. Defaults to the number of CPUs, 1 runs in this process.
+        compressor (str or callable): The compression backend, see make_compressor.
+        level (int): The compression level of the backend, see make_compressor.
+    """
     num_strings = len(test_strings)
     ncd_matrix = np.zeros((num_strings, num_strings))
-    
-    for i in range(num_strings):
-        for j in range(i + 1, num_strings):
-            try:
-                ncd = calculate_ncd(test_strings[i], test_strings[j])
-                ncd_matrix[i, j] = ncd
-                ncd_matrix[j, i] = ncd  # Since NCD is symmetric
-            except ValueError as e:
-                print(f"Error calculating NCD for pair ({i}, {j}): {e}")
-                ncd_matrix[i, j] = float('inf')
-                ncd_matrix[j, i] = float('inf')
+    compress = make_compressor(compressor, level, test_strings)
+    encoded_strings, compressed_lengths = compress_strings(test_strings, compress)
+
+    workers = workers or os.cpu_count() or 1
+    blocks = ncd_row_blocks(num_strings, workers * 4)
+    if workers > 1 and len(blocks) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_ncd_worker,
+                                 initargs=(encoded_strings, compressed_lengths, compress)) as executor:
+            results = list(executor.map(ncd_rows, blocks))
+    else:
+        init_ncd_worker(encoded_strings, compressed_lengths, compress)
+        results = [ncd_rows(block) for block in blocks]
+
+    for start, rows in results:
+        for i, row in enumerate(rows, start=start):
+            ncd_matrix[i, i + 1:] = row
+            ncd_matrix[i + 1:, i] = row  # Since NCD is symmetric
     
     return ncd_matrix
 
-def create_tfidf_matrix(test_case_strings):
-    """Create the TF-IDF matrix for the given test cases (as strings)."""
+def create_tfidf_matrix(test_case_strings, feature_cache=None):
+    """
+    Create the TF-IDF matrix for the given test cases (as strings).
+
+    If a TfidfFeatureCache is given, the matrix is fitted once per distinct input and reused.
+    """
+    if feature_cache is not None:
+        return feature_cache.matrix(test_case_strings)
+
     vectorizer = TfidfVectorizer()
     tfidf_matrix = vectorizer.fit_transform(test_case_strings)
 
     return tfidf_matrix
 
-def calculate_cosine_similarity(test_case_strings):
+class TfidfFeatureCache:
+    """
+    Cache of fitted TF-IDF matrices keyed on the input strings (the view), so the cosine,
+    Euclidean and Manhattan metrics of a view share one TfidfVectorizer fit.
+
+    With a cache_dir, fitted matrices and vocabularies are saved as <key>.npz / <key>.vocab.json
+    and loaded on later runs instead of refitting.
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir
+        self.matrices = {}
+        self.vocabularies = {}
+        self.fits = 0
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def view_key(test_case_strings):
+        """Hash the input strings to key the cache."""
+        digest = hashlib.sha256()
+        for string in test_case_strings:
+            digest.update(string.encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def load(self, key):
+        """Load a fitted matrix and vocabulary from the cache directory, returning True if found."""
+        if self.cache_dir is None:
+            return False
+        matrix_path = os.path.join(self.cache_dir, f"{key}.npz")
+        vocabulary_path = os.path.join(self.cache_dir, f"{key}.vocab.json")
+        if not (os.path.exists(matrix_path) and os.path.exists(vocabulary_path)):
+            return False
+
+        self.matrices[key] = scipy.sparse.load_npz(matrix_path).tocsr()
+        with open(vocabulary_path) as f:
+            self.vocabularies[key] = json.load(f)
+        return True
+
+    def fit(self, key, test_case_strings):
+        """Fit the TF-IDF vectorizer on a view and save it to the cache directory."""
+        vectorizer = TfidfVectorizer()
+        self.matrices[key] = vectorizer.fit_transform(test_case_strings).tocsr()
+        self.vocabularies[key] = {term: int(index) for term, index in vectorizer.vocabulary_.items()}
+        self.fits += 1
+
+        if self.cache_dir is not None:
+            scipy.sparse.save_npz(os.path.join(self.cache_dir, f"{key}.npz"), self.matrices[key])
+            with open(os.path.join(self.cache_dir, f"{key}.vocab.json"), 'w') as f:
+                json.dump(self.vocabularies[key], f)
+
+    def matrix(self, test_case_strings):
+        """Return the sparse TF-IDF matrix of the view, fitting it only the first time."""
+        key = self.view_key(test_case_strings)
+        if key not in self.matrices and not self.load(key):
+            self.fit(key, test_case_strings)
+        return self.matrices[key]
+
+    def vocabulary(self, test_case_strings):
+        """Return the {term: column} vocabulary of the view's fitted vectorizer."""
+        key = self.view_key(test_case_strings)
+        self.matrix(test_case_strings)
+        return self.vocabularies[key]
+
+def calculate_cosine_similarity(test_case_strings, feature_cache=None):
     """Calculate cosine similarity between test cases."""
-    tfidf_matrix = create_tfidf_matrix(test_case_strings)
+    tfidf_matrix = create_tfidf_matrix(test_case_strings, feature_cache)
 
     similarity_matrix = cosine_similarity(tfidf_matrix, tfidf_matrix)
 
     return similarity_matrix
 
-def calculate_euclidean_distance(test_case_strings):
-    """Calculate the Euclidean distance between test cases."""
-    tfidf_matrix = create_tfidf_matrix(test_case_strings).toarray()
+def calculate_euclidean_distance(test_case_strings, feature_cache=None, block_size=1024):
+    """
+    Calculate the Euclidean distance between test cases.
+
+    Works on the sparse TF-IDF matrix a block of rows at a time using ||a||^2 + ||b||^2 - 2a.b,
+    so only block_size x n values are computed at once.
+    """
+    tfidf_matrix = scipy.sparse.csr_matrix(create_tfidf_matrix(test_case_strings, feature_cache))
     num_test_cases = tfidf_matrix.shape[0]
+    squared_norms = row_squared_norms(tfidf_matrix)
     euclidean_distances = np.zeros((num_test_cases, num_test_cases))
-    for i in range(num_test_cases):
-        for j in range(i+1, num_test_cases):
-            euclidean_distances[i, j] = np.linalg.norm(tfidf_matrix[i] - tfidf_matrix[j])
-            euclidean_distances[j, i] = euclidean_distances[i, j]  # Since the distance is symmetric
+    for start in range(0, num_test_cases, block_size):
+        stop = min(start + block_size, num_test_cases)
+        euclidean_distances[start:stop] = euclidean_block(tfidf_matrix, squared_norms, start, stop)
+    np.fill_diagonal(euclidean_distances, 0)
     return euclidean_distances
 
-def calculate_manhattan_distance(test_case_strings):
-    """Calculate the Manhattan distance between test cases."""
-    tfidf_matrix = create_tfidf_matrix(test_case_strings).toarray()
+def row_squared_norms(tfidf_matrix):
+    """Squared L2 norm of each row of a sparse matrix."""
+    return np.asarray(tfidf_matrix.multiply(tfidf_matrix).sum(axis=1)).ravel()
+
+def euclidean_block(tfidf_matrix, squared_norms, start, stop):
+    """Euclidean distances from rows start:stop to every row, using ||a||^2 + ||b||^2 - 2a.b."""
+    dot_products = (tfidf_matrix[start:stop] @ tfidf_matrix.T).toarray()
+    squared = squared_norms[start:stop, None] + squared_norms[None, :] - 2 * dot_products
+    # rounding can leave tiny negative values for identical rows
+    np.maximum(squared, 0, out=squared)
+    return np.sqrt(squared)
+
+def calculate_manhattan_distance(test_case_strings, feature_cache=None, block_size=1024):
+    """
+    Calculate the Manhattan distance between test cases.
+
+    Works on the sparse TF-IDF matrix a block of rows at a time, so only block_size x n values are computed at once.
+    """
+    tfidf_matrix = scipy.sparse.csr_matrix(create_tfidf_matrix(test_case_strings, feature_cache))
     num_test_cases = tfidf_matrix.shape[0]
     manhattan_distances = np.zeros((num_test_cases, num_test_cases))
-    for i in range(num_test_cases):
-        for j in range(i+1, num_test_cases):
-            manhattan_distances[i, j] = np.sum(np.abs(tfidf_matrix[i] - tfidf_matrix[j]))
-            manhattan_distances[j, i] = manhattan_distances[i, j]  # Since the distance is symmetric
+    for start in range(0, num_test_cases, block_size):
+        stop = min(start + block_size, num_test_cases)
+        manhattan_distances[start:stop] = pairwise_manhattan_distances(tfidf_matrix[start:stop], tfidf_matrix)
+    np.fill_diagonal(manhattan_distances, 0)
     return manhattan_distances
 
-def plot_individual_heatmap(matrix, title):
-    """Plot a single similarity matrix using a heatmap."""
+NEAREST_METRICS = ("cosine", "euclidean", "manhattan", "ncd")
+
+def view_strings(test_data, view):
+    """Return the strings of a view: "step_name", "step_name_cleaned", "step_definition" or "title"."""
+    if isinstance(test_data, Corpus):
+        return test_data.view(view)
+    if view == "title":
+        return stringify_test_titles(test_data)[1]
+    return stringify_test_cases(test_data, view)
+
+def top_k_smallest(distances, k, offset):
+    """
+    Find the k smallest values in each row of a block of distances, excluding each row's own column.
+
+    Args:
+        distances (np.ndarray): The block of distances, rows offset:offset+len(distances) against every column.
+        k (int): The number of neighbours to keep.
+        offset (int): The index of the first row of the block.
+
+    Returns:
+        tuple: The neighbour indices and distances, each of shape (rows, k), nearest first.
+    """
+    rows = np.arange(distances.shape[0])
+    # nan sorts after inf, so a row is never its own neighbour
+    distances[rows, rows + offset] = np.nan
+    nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    nearest_distances = np.take_along_axis(distances, nearest, axis=1)
+    order = np.argsort(nearest_distances, axis=1, kind='stable')
+    return np.take_along_axis(nearest, order, axis=1), np.take_along_axis(nearest_distances, order, axis=1)
+
+def nearest_scenarios(test_data, view, metric="cosine", k=10, block_size=1024, feature_cache=None, workers=None, compressor="zlib", level=None):
+    """
+    Find the k most similar scenarios of each scenario without building the full n x n matrix.
+
+    Distances are computed block_size rows at a time and reduced to the top k of each row with a
+    partial sort, so memory stays O(n * k) plus one block.
+
+    Args:
+        test_data (list): The parsed test cases.
+        view (str): "step_name", "step_name_cleaned", "step_definition" or "title".
+        metric (str): "cosine", "euclidean", "manhattan" or "ncd".
+        k (int): The number of neighbours of each scenario.
+        block_size (int): The number of rows computed at once.
+        feature_cache (TfidfFeatureCache): Optional cache of fitted TF-IDF matrices.
+        workers (int): Number of processes for NCD. Defaults to the number of CPUs.
+        compressor (str or callable): The NCD compression backend, see make_compressor.
+        level (int): The compression level of the NCD backend.
+
+    Returns:
+        tuple: (neighbours, scores) arrays of shape (n, k), most similar first. Scores are cosine
+               similarities for "cosine" and distances for the other metrics.
+    """
+    if metric not in NEAREST_METRICS:
+        raise ValueError(f"Unknown metric {metric!r}, expected one of {NEAREST_METRICS}.")
+
+    test_strings = view_strings(test_data, view)
+    num_test_cases = len(test_strings)
+    k = min(k, num_test_cases - 1)
+    if k < 1:
+        return np.zeros((num_test_cases, 0), dtype=int), np.zeros((num_test_cases, 0))
+
+    blocks = [(start, min(start + block_size, num_test_cases)) for start in range(0, num_test_cases, block_size)]
+
+    if metric == "ncd":
+        compress = make_compressor(compressor, level, test_strings)
+        encoded_strings, compressed_lengths = compress_strings(test_strings, compress)
+        workers = workers or os.cpu_count() or 1
+        ncd_blocks = [(start, stop, k) for start, stop in blocks]
+        if workers > 1 and len(blocks) > 1:
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_ncd_worker,
+                                     initargs=(encoded_strings, compressed_lengths, compress)) as executor:
+                results = list(executor.map(ncd_top_k, ncd_blocks))
+        else:
+            init_ncd_worker(encoded_strings, compressed_lengths, compress)
+            results = [ncd_top_k(block) for block in ncd_blocks]
+    else:
+        tfidf_matrix = scipy.sparse.csr_matrix(create_tfidf_matrix(test_strings, feature_cache))
+        squared_norms = row_squared_norms(tfidf_matrix) if metric == "euclidean" else None
+        results = []
+        for start, stop in blocks:
+            if metric == "cosine":
+                # rank by negative similarity so the most similar come first
+                distances = -cosine_similarity(tfidf_matrix[start:stop], tfidf_matrix)
+            elif metric == "euclidean":
+                distances = euclidean_block(tfidf_matrix, squared_norms, start, stop)
+            else:
+                distances = pairwise_manhattan_distances(tfidf_matrix[start:stop], tfidf_matrix)
+            results.append(top_k_smallest(distances, k, start))
+
+    neighbours = np.vstack([nearest for nearest, _ in results])
+    scores = np.vstack([nearest_distances for _, nearest_distances in results])
+    if metric == "cosine":
+        scores = -scores
+    return neighbours, scores
+
+def neighbour_graph(neighbours, scores):
+    """Convert top-k neighbour lists into a sparse n x n matrix with the scores of each scenario's neighbours."""
+    num_test_cases = neighbours.shape[0]
+    rows = np.repeat(np.arange(num_test_cases), neighbours.shape[1])
+    return scipy.sparse.csr_matrix((scores.ravel(), (rows, neighbours.ravel())), shape=(num_test_cases, num_test_cases))
+
+def matrix_neighbour_graph(matrix, k, similarity=False):
+    """Keep the k most similar scenarios of each row of a dense matrix as a sparse neighbour graph."""
+    k = min(k, matrix.shape[0] - 1)
+    distances = -matrix if similarity else np.array(matrix, dtype=np.float64)
+    neighbours, scores = top_k_smallest(distances, k, 0)
+    return neighbour_graph(neighbours, -scores if similarity else scores)
+
+def plot_individual_heatmap(matrix, title, path=None):
+    """Plot a single similarity matrix using a heatmap, saving it to path instead of showing it if given."""
     plt.figure(figsize=(8, 8))
     plt.imshow(matrix, cmap='hot', interpolation='nearest')
     plt.title(title)
     plt.xlabel('Test Case Index')
     plt.ylabel('Test Case Index')
     plt.colorbar()
-    plt.show()
+    if path is None:
+        plt.show()
+    else:
+        plt.savefig(path)
+        plt.close()
 
 def plot_heatmaps(step_matrix, glue_matrix, title_matrix, type):
     """Plot similarity matrix using heatmaps"""
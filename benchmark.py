@@ -0,0 +1,165 @@
+import os
+import sys
+import glob
+import json
+import time
+import platform
+import subprocess
+import tracemalloc
+from datetime import datetime, timezone
+from analysis_funcs import read_test_cases, true_cluster_labels, cluster_labels, cluster_scores, CLUSTERING_BACKENDS, VIEW_KEYS
+from evaluation import MEASURES, init_evaluation_worker, calculate_matrix, view_features
+from corpus import Corpus
+
+def find_benchmark_datasets(data_dir="./data"):
+    """Find every data/<project>/<project>_parsed_steps*.json file."""
+    data_files = []
+    for project_dir in sorted(glob.glob(os.path.join(data_dir, "*"))):
+        project = os.path.basename(project_dir)
+        data_files.extend(sorted(glob.glob(os.path.join(project_dir, f"{project}_parsed_steps*.json*"))))
+    return data_files
+
+def scale_corpus(test_data, factor):
+    """
+    Build a synthetic corpus with factor copies of every scenario.
+
+    Each copy gets its own feature file name, so the number of true clusters grows with the corpus.
+    """
+    if factor == 1:
+        return test_data
+
+    scaled = []
+    for copy in range(factor):
+        for test in test_data:
+            scaled.append({
+                **test,
+                "feature_file": f"{test['feature_file']}#{copy}",
+                "test_num": len(scaled) + 1,
+                "test_case": f"{test['test_case']} #{copy}",
+            })
+    return scaled
+
+class StageTimer:
+    """Record the wall time and peak traced memory of each named stage."""
+
+    def __init__(self):
+        self.stages = {}
+
+    def run(self, name, function, *args, **kwargs):
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        seconds = time.perf_counter() - start
+        self.stages[name] = {"seconds": seconds, "peak_bytes": tracemalloc.get_traced_memory()[1]}
+        return result
+
+def build_views(test_data):
+    """Intern the test cases into a Corpus and join the string of every view they have data for."""
+    corpus = Corpus.from_test_cases(test_data)
+    return {view: corpus.view(data_key) for view, data_key in VIEW_KEYS.items() if corpus.has_view(data_key)}
+
+def benchmark_corpus(test_data, max_matrix_scenarios=3000, measures=MEASURES, backends=("kmeans",)):
+    """
+    Time every stage of the analysis pipeline on one corpus.
+
+    Matrix, clustering and scoring stages are skipped for corpora larger than max_matrix_scenarios,
+    since the n x n matrices would not fit in memory. Each matrix is clustered and scored with
+    every backend in backends.
+
+    Returns:
+        dict: Stage name -> {"seconds", "peak_bytes"}, or {"skipped": reason}.
+    """
+    timer = StageTimer()
+    views = timer.run("stringify", build_views, test_data)
+    true_labels, true_keys = true_cluster_labels(test_data)
+    num_clusters = len(true_keys)
+
+    # the TF-IDF fit of a view is timed in its first TF-IDF measure and reused by the others
+    init_evaluation_worker(views, true_labels, true_keys, num_clusters, {})
+    for view, test_strings in views.items():
+        for measure in measures:
+            name = f"{view} {measure}"
+            if len(test_strings) > max_matrix_scenarios:
+                timer.stages[name] = {"skipped": f"more than {max_matrix_scenarios} scenarios"}
+                continue
+
+            try:
+                matrix = timer.run(f"{name} matrix", calculate_matrix, measure, test_strings)
+            except Exception as e:
+                print(f"Error benchmarking {name}: {e!r}")
+                timer.stages[f"{name} error"] = {"error": repr(e)}
+                continue
+
+            for backend in backends:
+                # the default backend keeps the stage names of earlier results
+                stage = name if backend == "kmeans" else f"{name} {backend}"
+                try:
+                    features = view_features(test_strings) if backend == "minibatch" else None
+                    predicted_labels = timer.run(f"{stage} clustering", cluster_labels, num_clusters, backend, matrix,
+                                                 measure == "Cosine", features)
+                    timer.run(f"{stage} scoring", cluster_scores, true_labels, predicted_labels)
+                except Exception as e:
+                    # keep benchmarking the other stages, e.g. when a backend finds fewer clusters than requested
+                    print(f"Error benchmarking {stage}: {e!r}")
+                    timer.stages[f"{stage} error"] = {"error": repr(e)}
+            matrix = None
+    return timer.stages
+
+def git_commit():
+    """Return the current git commit, or None outside a git checkout."""
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(data_dir="./data", scales=(1, 2, 10, 50), max_matrix_scenarios=3000, measures=MEASURES, output_file="benchmark_results.json",
+                   backends=("kmeans",)):
+    """
+    Benchmark every bundled dataset at every scale and write the results to a JSON file.
+
+    Returns:
+        dict: The metadata and one result per (dataset, scale).
+    """
+    tracemalloc.start()
+    results = []
+    for data_file in find_benchmark_datasets(data_dir):
+        timer = StageTimer()
+        test_data = timer.run("load", lambda: list(read_test_cases(data_file)))
+        for scale in scales:
+            print(f"Benchmarking {data_file} x{scale}")
+            corpus = scale_corpus(test_data, scale)
+            stages = {**timer.stages, **benchmark_corpus(corpus, max_matrix_scenarios, measures, backends)}
+            results.append({
+                "data_file": data_file,
+                "scale": scale,
+                "scenarios": len(corpus),
+                "stages": stages,
+            })
+    tracemalloc.stop()
+
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(),
+        "git_commit": git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+    if output_file is not None:
+        with open(output_file, 'w') as f:
+            json.dump(report, f, indent=4)
+        print(f"Benchmark results have been written to {output_file}")
+    return report
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Time each stage of the analysis pipeline on the bundled datasets.")
+    parser.add_argument("--data-dir", type=str, default="./data", help="Directory with one folder of parsed steps per project (default: ./data)")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 2, 10, 50], help="Synthetic corpus sizes as multiples of each dataset (default: 1 2 10 50)")
+    parser.add_argument("--max-matrix-scenarios", type=int, default=3000, help="Skip matrix stages above this many scenarios (default: 3000)")
+    parser.add_argument("--measures", type=str, nargs="+", default=list(MEASURES), choices=MEASURES, help="Distance measures to benchmark (default: all)")
+    parser.add_argument("--backends", type=str, nargs="+", default=["kmeans"], choices=CLUSTERING_BACKENDS, help="Clustering backends to benchmark (default: kmeans)")
+    parser.add_argument("--output", type=str, default="benchmark_results.json", help="Output JSON file (default: benchmark_results.json)")
+    args = parser.parse_args()
+
+    run_benchmarks(args.data_dir, args.scales, args.max_matrix_scenarios, args.measures, args.output, args.backends)
\ No newline at end of file
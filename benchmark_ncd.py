@@ -0,0 +1,56 @@
+import os
+import glob
+import time
+from analysis_funcs import read_test_cases, stringify_test_cases, calculate_pairwise_ncd
+
+BACKENDS = [
+    ("zlib", None),
+    ("zlib", 1),
+    ("zlib", 9),
+    ("bz2", None),
+    ("lzma", None),
+    ("zlib-dict", None),
+]
+
+def find_datasets(data_dir="./data"):
+    """Find the newest parsed steps file of each project under the data directory."""
+    datasets = {}
+    for data_file in sorted(glob.glob(os.path.join(data_dir, "*", "*_parsed_steps*.json*"))):
+        project = os.path.basename(os.path.dirname(data_file))
+        # the later files (e.g. _parsed_steps_2.json) sort after the originals
+        datasets[project] = data_file
+    return datasets
+
+def benchmark_ncd(data_file, data_key="step_name", max_scenarios=200, workers=1):
+    """
+    Time calculate_pairwise_ncd with each compressor backend on one dataset.
+
+    Returns:
+        list: (backend, level, pairs, seconds, pairs per second) for each backend.
+    """
+    test_data = list(read_test_cases(data_file))[:max_scenarios]
+    test_strings = stringify_test_cases(test_data, data_key)
+    num_pairs = len(test_strings) * (len(test_strings) - 1) // 2
+
+    results = []
+    for compressor, level in BACKENDS:
+        start = time.perf_counter()
+        calculate_pairwise_ncd(test_strings, workers=workers, compressor=compressor, level=level)
+        seconds = time.perf_counter() - start
+        results.append((compressor, level, num_pairs, seconds, num_pairs / seconds if seconds else float('inf')))
+    return results
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Benchmark the NCD compressor backends on the bundled datasets.")
+    parser.add_argument("--data-dir", type=str, default="./data", help="Directory with one folder of parsed steps per project (default: ./data)")
+    parser.add_argument("--data-key", type=str, default="step_name", help="Step field to compare (default: step_name)")
+    parser.add_argument("--max-scenarios", type=int, default=200, help="Number of scenarios per project (default: 200)")
+    parser.add_argument("--workers", type=int, default=1, help="Number of NCD worker processes (default: 1)")
+    args = parser.parse_args()
+
+    print(f"{'Project':<15}{'Backend':<12}{'Level':>6}{'Pairs':>10}{'Seconds':>10}{'Pairs/s':>12}")
+    for project, data_file in find_datasets(args.data_dir).items():
+        for compressor, level, num_pairs, seconds, pairs_per_second in benchmark_ncd(data_file, args.data_key, args.max_scenarios, args.workers):
+            level = "-" if level is None else level
+            print(f"{project:<15}{compressor:<12}{level:>6}{num_pairs:>10}{seconds:>10.2f}{pairs_per_second:>12.0f}")
\ No newline at end of file
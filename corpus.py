@@ -0,0 +1,182 @@
+from typing import Dict, Iterable, Iterator, List, Tuple
+import numpy as np
+
+# Per-step fields stored as interned id columns
+STEP_FIELDS = ("step_name", "step_name_cleaned", "step_definition", "step_definition_file")
+# The view made of the scenario titles rather than the steps
+TITLE_VIEW = "title"
+# Id of a step field that is missing from a step
+MISSING = -1
+
+class StringTable:
+    """Interns values, giving each distinct value an id in order of first appearance."""
+
+    def __init__(self):
+        self.ids = {}
+        self.values = []
+
+    def __len__(self):
+        return len(self.values)
+
+    def intern(self, value) -> int:
+        """Return the id of the value, adding it to the table if it is new."""
+        index = self.ids.get(value)
+        if index is None:
+            index = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return index
+
+class Corpus:
+    """
+    Columnar, interned representation of a parsed steps corpus.
+
+    Feature files, titles, step names and step definition bodies are stored once in string
+    tables and referenced by integer ids. The steps of scenario i are rows
+    step_offsets[i]:step_offsets[i + 1] of the step columns. The text views used by the
+    similarity metrics are joined from the tables on first use and cached.
+    """
+
+    def __init__(self, feature_files: List[str], feature_file_ids: np.ndarray, test_nums: np.ndarray,
+                 titles: List[str], title_ids: np.ndarray, step_offsets: np.ndarray, step_nums: np.ndarray,
+                 step_tables: Dict[str, list], step_columns: Dict[str, np.ndarray]):
+        """
+        Args:
+            feature_files (list): The distinct feature files, indexed by feature_file_ids.
+            feature_file_ids (np.ndarray): The feature file of each scenario.
+            test_nums (np.ndarray): The test number of each scenario.
+            titles (list): The distinct scenario titles, indexed by title_ids.
+            title_ids (np.ndarray): The title of each scenario.
+            step_offsets (np.ndarray): Start of each scenario's steps, with the total number of steps appended.
+            step_nums (np.ndarray): The step number of each step.
+            step_tables (dict): The distinct values of each step field.
+            step_columns (dict): The id of each step's value for each step field, MISSING if absent.
+        """
+        self.feature_files = feature_files
+        self.feature_file_ids = feature_file_ids
+        self.test_nums = test_nums
+        self.titles = titles
+        self.title_ids = title_ids
+        self.step_offsets = step_offsets
+        self.step_nums = step_nums
+        self.step_tables = step_tables
+        self.step_columns = step_columns
+        self.views = {}
+
+    @classmethod
+    def from_test_cases(cls, test_cases: Iterable[dict]) -> "Corpus":
+        """
+        Build the corpus from parsed test cases, e.g. read_test_cases(data_file).
+
+        The test cases are consumed one at a time, so a streamed .jsonl file is never held in memory as dicts.
+        """
+        feature_files = StringTable()
+        titles = StringTable()
+        step_tables = {field: StringTable() for field in STEP_FIELDS}
+        feature_file_ids = []
+        test_nums = []
+        title_ids = []
+        step_offsets = [0]
+        step_nums = []
+        step_columns = {field: [] for field in STEP_FIELDS}
+
+        for test_case in test_cases:
+            feature_file_ids.append(feature_files.intern(test_case["feature_file"]))
+            test_nums.append(test_case["test_num"])
+            title_ids.append(titles.intern(test_case["test_case"]))
+            for step in test_case["steps"]:
+                step_nums.append(step["step_num"])
+                for field in STEP_FIELDS:
+                    step_columns[field].append(step_tables[field].intern(step[field]) if field in step else MISSING)
+            step_offsets.append(len(step_nums))
+
+        return cls(
+            feature_files.values,
+            np.array(feature_file_ids, dtype=np.int32),
+            np.array(test_nums, dtype=np.int32),
+            titles.values,
+            np.array(title_ids, dtype=np.int32),
+            np.array(step_offsets, dtype=np.int64),
+            np.array(step_nums, dtype=np.int32),
+            {field: table.values for field, table in step_tables.items()},
+            {field: np.array(ids, dtype=np.int32) for field, ids in step_columns.items()},
+        )
+
+    def __len__(self):
+        return len(self.test_nums)
+
+    @property
+    def num_steps(self) -> int:
+        return int(self.step_offsets[-1])
+
+    def has_view(self, data_key: str) -> bool:
+        """Check whether every step has the field of the view."""
+        if data_key == TITLE_VIEW:
+            return True
+        return data_key in self.step_columns and not np.any(self.step_columns[data_key] == MISSING)
+
+    def view(self, data_key: str) -> List[str]:
+        """
+        Return the text of each scenario for a view, joining it the first time it is asked for.
+
+        Args:
+            data_key (str): A step field (e.g. "step_name") or "title" for the scenario titles.
+
+        Returns:
+            list: One string per scenario, the same as stringify_test_cases / stringify_test_titles.
+                  The list is cached and shared, so it must not be modified.
+        """
+        if data_key not in self.views:
+            if data_key == TITLE_VIEW:
+                self.views[data_key] = [self.titles[i] for i in self.title_ids.tolist()]
+            else:
+                self.views[data_key] = self.join_steps(data_key)
+        return self.views[data_key]
+
+    def join_steps(self, data_key: str) -> List[str]:
+        """Join the "<step_num>: <value>" line of every step into one string per scenario."""
+        if not self.has_view(data_key):
+            raise KeyError(data_key)
+
+        values = self.step_tables[data_key]
+        lines = [f"{step_num}: {values[i]}\n" for step_num, i in zip(self.step_nums.tolist(), self.step_columns[data_key].tolist())]
+        offsets = self.step_offsets.tolist()
+        return ["".join(lines[start:stop]) for start, stop in zip(offsets, offsets[1:])]
+
+    def scenario(self, i: int) -> dict:
+        """Return the feature file, test number and title of a scenario, without its steps."""
+        return {
+            "feature_file": self.feature_files[self.feature_file_ids[i]],
+            "test_num": int(self.test_nums[i]),
+            "test_case": self.titles[self.title_ids[i]],
+        }
+
+    def scenarios(self) -> List[dict]:
+        """Return the scenarios without their steps, as used for the true clusters."""
+        return [self.scenario(i) for i in range(len(self))]
+
+    def test_case(self, i: int) -> dict:
+        """Rebuild a scenario as it appears in the parsed steps file."""
+        test_case = self.scenario(i)
+        steps = []
+        for row in range(self.step_offsets[i], self.step_offsets[i + 1]):
+            step = {"step_num": int(self.step_nums[row])}
+            for field in STEP_FIELDS:
+                index = self.step_columns[field][row]
+                if index != MISSING:
+                    step[field] = self.step_tables[field][index]
+            steps.append(step)
+        test_case["steps"] = steps
+        return test_case
+
+    def __iter__(self) -> Iterator[dict]:
+        for i in range(len(self)):
+            yield self.test_case(i)
+
+    def true_cluster_labels(self) -> Tuple[np.ndarray, List[str]]:
+        """
+        Return the feature file of each scenario as its true cluster.
+
+        Returns:
+            tuple: The true cluster of each scenario as an int array, and the feature file of each cluster.
+        """
+        return self.feature_file_ids.astype(np.intp), list(self.feature_files)
@@ -0,0 +1,186 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+import os
+import re
+import json
+import pickle
+import hashlib
+from step_matcher import StepMatcher, pattern_filter
+
+# Bumped whenever the layout of a .stepcache file or the output of pattern_filter changes
+CACHE_FORMAT = 1
+
+class DefinitionLayer:
+    """
+    One source of step definitions, e.g. a project's parsed_stepdefinitions.json or the Aruba definitions.
+
+    Along with the definitions, a layer holds the matcher filter (literal prefix and required
+    literals) of each pattern, so a StepMatcher can be built from it without analysing or
+    compiling any regex. A layer can be saved to a binary .stepcache file keyed by the hash of
+    the JSON file it was read from, and is loaded from it instead of the JSON while that file is
+    unchanged.
+    """
+
+    def __init__(self, name: str, definitions: Dict[str, dict], filters: Optional[List[Tuple[str, Tuple[str, ...]]]]=None,
+                 version: Optional[str]=None, source: Optional[str]=None):
+        """
+        Args:
+            name (str): The name of the layer, recorded as the provenance of its definitions.
+            definitions (dict): {pattern: {"Code", "File"}}
+            filters (list): The pattern_filter of each pattern, in the order of the definitions. Computed if not given.
+            version (str): Hash of the file the definitions were read from, if any.
+            source (str): Path of the file the definitions were read from, if any.
+        """
+        self.name = name
+        self.definitions = definitions
+        if filters is None:
+            filters = [pattern_filter(pattern, re.compile(pattern)) for pattern in definitions]
+        self.filters = filters
+        self.version = version
+        self.source = source
+
+    def __len__(self):
+        return len(self.definitions)
+
+    @staticmethod
+    def cache_path(cache_dir: str, name: str, version: str) -> str:
+        """Return the .stepcache file of a version of a layer."""
+        return os.path.join(cache_dir, f"{name}-{version[:16]}.stepcache")
+
+    @classmethod
+    def from_file(cls, name: str, definitions_file: str, cache_dir: Optional[str]=None) -> "DefinitionLayer":
+        """
+        Read a layer from a step definitions JSON file, through the cache directory if one is given.
+
+        Args:
+            name (str): The name of the layer.
+            definitions_file (str): The JSON file of step definitions.
+            cache_dir (str): Directory of .stepcache files. The layer is loaded from its cache file if the
+                             JSON file hasn't changed since it was written, otherwise it is built and saved.
+
+        Returns:
+            DefinitionLayer: The layer.
+        """
+        with open(definitions_file, 'rb') as f:
+            data = f.read()
+        version = hashlib.sha256(data).hexdigest()
+
+        cache_file = cls.cache_path(cache_dir, name, version) if cache_dir is not None else None
+        if cache_file is not None:
+            layer = cls.load(cache_file, version)
+            if layer is not None:
+                return layer
+
+        layer = cls(name, json.loads(data), version=version, source=definitions_file)
+        if cache_file is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            layer.save(cache_file)
+        return layer
+
+    @classmethod
+    def load(cls, cache_file: str, version: Optional[str]=None) -> Optional["DefinitionLayer"]:
+        """
+        Load a layer saved by save.
+
+        Args:
+            cache_file (str): The .stepcache file.
+            version (str): The expected version. A file of another version or format is ignored.
+
+        Returns:
+            DefinitionLayer or None: The layer, or None if the file is missing, unreadable or stale.
+        """
+        if not os.path.exists(cache_file):
+            return None
+
+        try:
+            with open(cache_file, 'rb') as f:
+                cached = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError) as e:
+            print(f"Ignoring unreadable definition cache {cache_file}: {e}")
+            return None
+
+        if cached.get("format") != CACHE_FORMAT or (version is not None and cached.get("version") != version):
+            return None
+
+        definitions = dict(zip(cached["keys"], cached["definitions"]))
+        filters = list(zip(cached["prefixes"], cached["tokens"]))
+        return cls(cached["name"], definitions, filters, cached["version"], cached["source"])
+
+    def save(self, cache_file: str) -> None:
+        """
+        Save the layer's definitions and matcher filters as columns of a binary .stepcache file.
+
+        Args:
+            cache_file (str): The path of the cache file.
+        """
+        cached = {
+            "format": CACHE_FORMAT,
+            "name": self.name,
+            "version": self.version,
+            "source": self.source,
+            "keys": list(self.definitions),
+            "definitions": list(self.definitions.values()),
+            "prefixes": [prefix for prefix, _ in self.filters],
+            "tokens": [tokens for _, tokens in self.filters],
+        }
+        with open(cache_file, 'wb') as f:
+            pickle.dump(cached, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+class DefinitionRegistry:
+    """
+    Step definitions merged from layers in order of precedence, recording where each came from.
+
+    When a pattern is defined by more than one layer, the definition of the earliest layer is
+    used and the others are recorded as shadowed. Patterns keep the order they were first
+    added in, which is also the order the StepMatcher tries them.
+    """
+
+    def __init__(self, layers: Iterable[DefinitionLayer]=()):
+        """
+        Args:
+            layers (iterable): The layers, highest precedence first.
+        """
+        self.layers = []
+        self.definitions = {}
+        self.filters = []
+        # pattern -> name of the layer its definition comes from
+        self.provenance = {}
+        # (pattern, shadowed layer, winning layer) for each duplicate definition
+        self.shadowed = []
+
+        for layer in layers:
+            self.add_layer(layer)
+
+    def __len__(self):
+        return len(self.definitions)
+
+    def __contains__(self, pattern: str):
+        return pattern in self.definitions
+
+    def add_layer(self, layer: DefinitionLayer) -> None:
+        """Add a layer with lower precedence than the layers already in the registry."""
+        self.layers.append(layer)
+        for (pattern, definition), filters in zip(layer.definitions.items(), layer.filters):
+            if pattern in self.definitions:
+                self.shadowed.append((pattern, layer.name, self.provenance[pattern]))
+                continue
+            self.definitions[pattern] = definition
+            self.filters.append(filters)
+            self.provenance[pattern] = layer.name
+
+    def source(self, pattern: str) -> Optional[str]:
+        """Return the name of the layer a pattern's definition comes from, or None if it isn't defined."""
+        return self.provenance.get(pattern)
+
+    def matcher(self) -> StepMatcher:
+        """Build a StepMatcher from the merged definitions and the layers' precomputed filters."""
+        return StepMatcher(self.definitions, self.filters)
+
+    def report(self) -> None:
+        """Print the number of definitions used from each layer and the shadowed duplicates."""
+        print("------------------------------------------------")
+        for layer in self.layers:
+            used = sum(1 for pattern in layer.definitions if self.provenance[pattern] == layer.name)
+            print(f"{layer.name}: {used} of {len(layer)} step definitions")
+        for pattern, layer_name, winner in self.shadowed:
+            print(f"{layer_name} definition of {pattern!r} is shadowed by {winner}")
+        print("------------------------------------------------")
@@ -0,0 +1,112 @@
+from typing import Iterable, Iterator, List, Tuple
+import os
+import hashlib
+from fnmatch import fnmatch
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_IGNORE_DIRS = ('vendor', 'node_modules', '.git')
+
+def is_ignored(name: str, ignore_dirs: Iterable[str]) -> bool:
+    """Check whether a directory name matches any of the ignore globs."""
+    return any(fnmatch(name, pattern) for pattern in ignore_dirs)
+
+def scan_directory(path: str, ignore_dirs: Iterable[str]) -> Tuple[List[str], List[str]]:
+    """
+    List the files and the subdirectories to descend into for a single directory.
+
+    Args:
+        path (str): The directory to scan.
+        ignore_dirs (iterable): Directory names or globs that are not descended into.
+
+    Returns:
+        tuple: The file paths and the subdirectory paths, in directory order.
+    """
+    files = []
+    subdirectories = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+
+                if not is_dir:
+                    files.append(entry.path)
+                # like os.walk, symlinked directories are not followed
+                elif not entry.is_symlink() and not is_ignored(entry.name, ignore_dirs):
+                    subdirectories.append(entry.path)
+    except OSError as e:
+        print(f"Skipping directory {path} due to {e}")
+
+    return files, subdirectories
+
+def walk_files(base_dir: str, ignore_dirs: Iterable[str]=DEFAULT_IGNORE_DIRS, workers: int=8) -> Iterator[str]:
+    """
+    Yield every file under the base directory, scanning subdirectories concurrently.
+
+    Subdirectories are scanned ahead of time by a thread pool, but files are yielded in the same
+    top-down order as os.walk, so callers get a deterministic order and can start work before the
+    walk has finished.
+
+    Args:
+        base_dir (str): The directory to search.
+        ignore_dirs (iterable): Directory names or globs that are not descended into.
+        workers (int): Number of threads scanning directories.
+
+    Yields:
+        str: The path of each file found.
+    """
+    ignore_dirs = tuple(ignore_dirs)
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        pending = [pool.submit(scan_directory, base_dir, ignore_dirs)]
+        while pending:
+            files, subdirectories = pending.pop().result()
+            # submit the subdirectories before yielding so they are scanned while the caller works
+            children = [pool.submit(scan_directory, subdirectory, ignore_dirs) for subdirectory in subdirectories]
+            pending.extend(reversed(children))
+            yield from files
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def discover_files(base_dir: str, file_type: str, ignore_dirs: Iterable[str]=DEFAULT_IGNORE_DIRS, workers: int=8, quiet: bool=False) -> Iterator[str]:
+    """
+    Yield the files under the base directory with the given extension.
+
+    Args:
+        base_dir (str): The directory to search.
+        file_type (str): The file extension to look for, e.g. ".feature".
+        ignore_dirs (iterable): Directory names or globs that are not descended into.
+        workers (int): Number of threads scanning directories.
+        quiet (bool): Don't print each file name as it is found.
+
+    Yields:
+        str: The path of each matching file.
+    """
+    for file_path in walk_files(base_dir, ignore_dirs, workers):
+        if file_path.endswith(file_type):
+            if not quiet:
+                print(os.path.basename(file_path))
+            yield file_path
+
+def file_fingerprint(file_path: str, previous: dict=None) -> dict:
+    """
+    Record the size, modification time and content hash of a file.
+
+    Args:
+        file_path (str): The path to the file.
+        previous (dict): The fingerprint from the last run. If the size and modification time are
+                         unchanged its content hash is reused instead of reading the file again.
+
+    Returns:
+        dict: The size, mtime_ns and sha256 of the file.
+    """
+    stat = os.stat(file_path)
+    if previous is not None and previous["size"] == stat.st_size and previous["mtime_ns"] == stat.st_mtime_ns:
+        content_hash = previous["sha256"]
+    else:
+        with open(file_path, 'rb') as f:
+            content_hash = hashlib.sha256(f.read()).hexdigest()
+
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": content_hash}
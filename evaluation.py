@@ -0,0 +1,189 @@
+import os
+import csv
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from analysis_funcs import (load_views, true_cluster_labels, cluster_labels, cluster_scores, plot_individual_heatmap,
+                            calculate_pairwise_ncd, calculate_cosine_similarity, calculate_euclidean_distance,
+                            calculate_manhattan_distance, matrix_neighbour_graph, TfidfFeatureCache, CLUSTERING_BACKENDS,
+                            PRECOMPUTED_BACKENDS, DEFAULT_NEIGHBOURS, FEATURES_MEASURE)
+
+MEASURES = ("NCD", "Cosine", "Euclidean", "Manhattan")
+VIEWS = ("Step Name", "Step Name Cleaned", "Step Definition", "Scenario Title")
+
+# Data shared by every job of a worker process, set once by init_evaluation_worker
+evaluation_data = None
+
+def init_evaluation_worker(views, true_labels, true_keys, num_clusters, options):
+    """Store the views and the true clusters once per worker process."""
+    global evaluation_data
+    evaluation_data = {
+        "views": views,
+        "true_labels": true_labels,
+        "true_keys": true_keys,
+        "num_clusters": num_clusters,
+        "options": options,
+        # TF-IDF fits are shared by the jobs of the same view that run in this worker
+        "feature_cache": TfidfFeatureCache(options.get("feature_cache_dir")),
+    }
+
+def calculate_matrix(measure, test_strings):
+    """Calculate the matrix of one measure for one view."""
+    options = evaluation_data["options"]
+    feature_cache = evaluation_data["feature_cache"]
+    if measure == "NCD":
+        # the jobs already run in parallel, so each NCD matrix runs in its worker
+        return calculate_pairwise_ncd(test_strings, workers=1, compressor=options.get("compressor", "zlib"), level=options.get("level"))
+    if measure == "Cosine":
+        return calculate_cosine_similarity(test_strings, feature_cache)
+    if measure == "Euclidean":
+        return calculate_euclidean_distance(test_strings, feature_cache)
+    return calculate_manhattan_distance(test_strings, feature_cache)
+
+def view_features(test_strings):
+    """Return the TF-IDF features of a view, fitted once per worker process."""
+    return evaluation_data["feature_cache"].matrix(test_strings)
+
+def evaluate_metric(job):
+    """
+    Compute the matrix of one (view, measure) pair, cluster it and score the clusters.
+
+    The FEATURES_MEASURE jobs of "minibatch" cluster the view's TF-IDF features instead, without any matrix.
+
+    Returns:
+        dict: The results row with precision, MAP, MRR, ARI, NMI and the wall time of each stage.
+    """
+    view, measure = job
+    matrix_name = f"{view} {measure}"
+    options = evaluation_data["options"]
+    backend = options.get("backend", "kmeans")
+
+    if measure == FEATURES_MEASURE:
+        # the matrix stage is the TF-IDF fit of the view
+        start = time.perf_counter()
+        features = view_features(evaluation_data["views"][view])
+        matrix_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        predicted_labels = cluster_labels(evaluation_data["num_clusters"], backend, features=features)
+        cluster_seconds = time.perf_counter() - start
+    else:
+        start = time.perf_counter()
+        matrix = calculate_matrix(measure, evaluation_data["views"][view])
+        matrix_seconds = time.perf_counter() - start
+
+        plot_dir = options.get("plot_dir")
+        if plot_dir is not None:
+            plot_individual_heatmap(matrix, f"{matrix_name} Heatmap", os.path.join(plot_dir, f"{matrix_name.replace(' ', '_')}.png"))
+
+        similarity = measure == "Cosine"
+        start = time.perf_counter()
+        graph = None
+        if options.get("neighbours") and backend in PRECOMPUTED_BACKENDS:
+            graph = matrix_neighbour_graph(matrix, options["neighbours"], similarity)
+        predicted_labels = cluster_labels(evaluation_data["num_clusters"], backend, matrix, similarity, graph=graph)
+        cluster_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scores = cluster_scores(evaluation_data["true_labels"], predicted_labels, evaluation_data["true_keys"])
+    score_seconds = time.perf_counter() - start
+
+    return {
+        "metric": matrix_name,
+        "view": view,
+        "measure": measure,
+        "backend": backend,
+        "precision": scores["precision"],
+        "map": scores["map"],
+        "mrr": scores["mrr"],
+        "ari": scores["ari"],
+        "nmi": scores["nmi"],
+        "matrix_seconds": matrix_seconds,
+        "cluster_seconds": cluster_seconds,
+        "score_seconds": score_seconds,
+    }
+
+def save_results(results, output_file):
+    """Save the results table as CSV if output_file ends in .csv, otherwise as JSON."""
+    if output_file.endswith(".csv"):
+        with open(output_file, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+            writer.writeheader()
+            writer.writerows(results)
+    else:
+        with open(output_file, 'w') as f:
+            json.dump(results, f, indent=4)
+
+def evaluate(data_file, workers=None, plot_dir=None, output_file=None, compressor="zlib", level=None, feature_cache_dir=None,
+             backend="kmeans", neighbours=DEFAULT_NEIGHBOURS):
+    """
+    Run the metrics of run_analysis headlessly on a process pool.
+
+    Args:
+        data_file (str): The parsed steps file (.json or .jsonl).
+        workers (int): Number of processes. Defaults to the number of CPUs, 1 runs every job in this process.
+        plot_dir (str): Save a heatmap of each matrix in this directory. Nothing is plotted by default.
+        output_file (str): Optional .json or .csv file to save the results table to.
+        compressor (str or callable): The NCD compression backend, see make_compressor.
+        level (int): The compression level of the NCD backend.
+        feature_cache_dir (str): Optional directory to save fitted TF-IDF matrices for later runs.
+        backend (str): The clustering backend, see cluster_labels. "minibatch" clusters the TF-IDF
+                       features of each view once instead of the 16 matrices, like run_analysis.
+        neighbours (int): The agglomerative, hdbscan and spectral backends cluster the top-k neighbour
+                          graph of each matrix (DEFAULT_NEIGHBOURS, as in run_analysis). 0 or None gives
+                          them the whole matrix.
+
+    Returns:
+        list: One results row per metric, in the same order as run_analysis.
+    """
+    start = time.perf_counter()
+    test_data, views = load_views(data_file)
+    load_seconds = time.perf_counter() - start
+
+    num_clusters = len(set(test['feature_file'] for test in test_data))
+    options = {"compressor": compressor, "level": level, "plot_dir": plot_dir, "feature_cache_dir": feature_cache_dir,
+               "backend": backend, "neighbours": neighbours}
+    if plot_dir is not None:
+        os.makedirs(plot_dir, exist_ok=True)
+    true_labels, true_keys = true_cluster_labels(test_data)
+    initargs = (views, true_labels, true_keys, num_clusters, options)
+
+    # group the jobs of a measure together, matching the order of run_analysis
+    jobs = [(view, measure) for measure in MEASURES for view in VIEWS]
+    if backend == "minibatch":
+        jobs = [(view, FEATURES_MEASURE) for view in VIEWS]
+    workers = workers or os.cpu_count() or 1
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_evaluation_worker, initargs=initargs) as executor:
+            results = list(executor.map(evaluate_metric, jobs))
+    else:
+        init_evaluation_worker(*initargs)
+        results = [evaluate_metric(job) for job in jobs]
+
+    for result in results:
+        result["load_seconds"] = load_seconds
+
+    if output_file is not None:
+        save_results(results, output_file)
+    return results
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Evaluate every similarity metric on a parsed steps file without plotting.")
+    parser.add_argument("data_file", type=str, help="The parsed steps file (.json or .jsonl)")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: number of CPUs)")
+    parser.add_argument("--output", type=str, default=None, help="Save the results table to a .json or .csv file")
+    parser.add_argument("--plot-dir", type=str, default=None, help="Save a heatmap of each matrix to this directory")
+    parser.add_argument("--compressor", type=str, default="zlib", help="NCD compression backend (default: zlib)")
+    parser.add_argument("--backend", type=str, default="kmeans", choices=CLUSTERING_BACKENDS, help="Clustering backend (default: kmeans)")
+    parser.add_argument("--neighbours", type=int, default=DEFAULT_NEIGHBOURS, help=f"Size of the top-k neighbour graph clustered by agglomerative, hdbscan and spectral, 0 for the whole matrix (default: {DEFAULT_NEIGHBOURS})")
+    args = parser.parse_args()
+
+    results = evaluate(args.data_file, args.workers, args.plot_dir, args.output, args.compressor,
+                       backend=args.backend, neighbours=args.neighbours)
+
+    print(f"{'Metric':<32}{'Precision':>10}{'MAP':>8}{'MRR':>8}{'ARI':>8}{'NMI':>8}{'Matrix s':>10}{'Cluster s':>11}{'Score s':>9}")
+    for result in results:
+        print(f"{result['metric']:<32}{result['precision']:>10.4f}{result['map']:>8.4f}{result['mrr']:>8.4f}"
+              f"{result['ari']:>8.4f}{result['nmi']:>8.4f}"
+              f"{result['matrix_seconds']:>10.2f}{result['cluster_seconds']:>11.2f}{result['score_seconds']:>9.3f}")
\ No newline at end of file
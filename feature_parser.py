@@ -1,26 +1,31 @@
 import os
 import re
 import json
+from contextlib import ExitStack
+from concurrent.futures import ProcessPoolExecutor
 from behave.parser import parse_file
+from behave.model import ScenarioOutline
+from step_matcher import StepMatcher, ResolutionCache, TemplateStep
+from definition_registry import DefinitionLayer, DefinitionRegistry
+from discovery import DEFAULT_IGNORE_DIRS, discover_files, file_fingerprint
+from gherkin_reader import ExamplesTable, read_feature_file, expand_outline, is_parametrized
 
-def find_feature_files(base_dir):
+# "behave" builds behave's full model of each feature file, "gherkin" only scans the scenario and step names
+FEATURE_READERS = ("behave", "gherkin")
+
+def find_feature_files(base_dir, ignore_dirs=DEFAULT_IGNORE_DIRS, quiet=False):
     """
-    Given the base directory, find all feature files.
+    Given the base directory, find all feature files as the directory walk reaches them.
 
     Args:
         base_dir (str): The base directory where the search for feature files will be conducted.
+        ignore_dirs (iterable): Directory names or globs that are not searched.
+        quiet (bool): Don't print each feature file as it is found.
 
     Returns:
-        list: A list of paths to the feature files found in the base directory.
-    """
-    feature_files = []
-    for root, dirs, files in os.walk(base_dir):
-        for file in files:
-            if file.endswith(".feature"):
-                print(file)
-                feature_files.append(os.path.join(root, file))
-    
-    return feature_files
+        iterator: The paths to the feature files found in the base directory, in a deterministic order.
+    """
+    return discover_files(base_dir, ".feature", ignore_dirs, quiet=quiet)
 
 def pattern_search(step_name, step_patterns):
     """
@@ -48,92 +53,313 @@ def replace_inputs_with_blank_quotes(step_name):
     
     return modified_text
 
-def feature_parser(base_dir, parsed_definitions, combined_directory='./data'):
+def read_scenarios(feature_file, reader="behave"):
+    """
+    Read the name, step names and examples of each scenario of a feature file.
+
+    Args:
+        feature_file (str): The path to the feature file.
+        reader (str): "behave" to use behave's parser, "gherkin" for the streaming reader. Both give the same scenarios.
+
+    Returns:
+        list or None: A list of (scenario name, step names, examples) tuples, or None if behave found no feature.
+                      examples is None for a Scenario and a list of ExamplesTable for a Scenario Outline.
+    """
+    if reader == "gherkin":
+        return [(record.name, record.steps, record.examples) for record in read_feature_file(feature_file)]
+
+    feature = parse_file(feature_file)
+
+    if feature is None:
+        return None
+
+    scenarios = []
+    for scenario in feature.scenarios:
+        examples = None
+        if isinstance(scenario, ScenarioOutline):
+            examples = [ExamplesTable(example.name, [] if example.table is None else list(example.table.headings),
+                                      [] if example.table is None else [list(row.cells) for row in example.table])
+                        for example in scenario.examples]
+        scenarios.append((scenario.name, [step.name for step in scenario.steps], examples))
+    return scenarios
+
+def match_scenario(scenario_name, step_names, step_cache, templates=None):
+    """
+    Find the glue code for each step of a scenario.
+
+    Args:
+        scenario_name (str): The name of the scenario.
+        step_names (list): The name of each step.
+        step_cache (ResolutionCache): The cache used to resolve step names to their definitions.
+        templates (list): The TemplateStep (or None) of each step when the scenario is a row of an outline.
+
+    Returns:
+        tuple: The scenario name, the steps with their glue code and the unmatched (step number, step name) pairs.
+    """
+    steps = []
+    unmatched_steps = []
+    # find the glue code for each step
+    for step_num, step_name in enumerate(step_names, start=1):
+        definition = step_cache.resolve(step_name, templates[step_num - 1] if templates else None)
+
+        steps.append({
+            "step_num": step_num,
+            "step_name": step_name,
+            "step_name_cleaned": replace_inputs_with_blank_quotes(step_name),
+            "step_definition": None if definition is None else definition['Code'],
+            "step_definition_file": None if definition is None else definition['File']
+        })
+
+        if definition is None:
+            unmatched_steps.append((step_num, step_name))
+
+    return scenario_name, steps, unmatched_steps
+
+def match_feature_file(feature_file, step_cache, reader="behave", expand_outlines=False):
+    """
+    Parse a feature file and find the glue code for each step of its scenarios.
+
+    Args:
+        feature_file (str): The path to the feature file.
+        step_cache (ResolutionCache): The cache used to resolve step names to their definitions.
+        reader (str): The feature file reader, see FEATURE_READERS.
+        expand_outlines (bool): Replace each Scenario Outline with one scenario per Examples row. The
+                                candidate patterns of each template step are found once per outline.
+
+    Returns:
+        list or None: A list of (scenario name, steps, unmatched steps) tuples, or None if the file could not be parsed.
+    """
+    feature_scenarios = read_scenarios(feature_file, reader)
+
+    if feature_scenarios is None:
+        return None
+
+    scenarios = []
+    for scenario_name, step_names, examples in feature_scenarios:
+        if not expand_outlines or examples is None:
+            scenarios.append(match_scenario(scenario_name, step_names, step_cache))
+            continue
+
+        templates = None
+        for row_name, row_steps in expand_outline(scenario_name, step_names, examples):
+            if templates is None:
+                # only built for outlines with rows, and shared by all of them
+                templates = [TemplateStep(step_cache.matcher, step_name) if is_parametrized(step_name) else None
+                             for step_name in step_names]
+            scenarios.append(match_scenario(row_name, row_steps, step_cache, templates))
+
+    return scenarios
+
+# Step cache and match_feature_file options of each worker process, set once by init_worker
+worker_step_cache = None
+worker_options = {}
+
+def init_worker(parsed_definitions, cache_size, cache_file, reader="behave", expand_outlines=False, filters=None):
+    """Build the step matcher and resolution cache once per worker process, reusing the parent's pattern filters if given."""
+    global worker_step_cache, worker_options
+    matcher = StepMatcher(parsed_definitions, filters)
+    worker_step_cache = ResolutionCache(matcher, parsed_definitions, cache_size, cache_file)
+    worker_step_cache.record_new_entries = True
+    worker_options = {"reader": reader, "expand_outlines": expand_outlines}
+
+def match_feature_file_worker(feature_file):
+    """
+    Match a feature file in a worker process.
+
+    Returns:
+        tuple: The result of match_feature_file, the cache hits and misses for this file,
+               and the step names newly resolved by the worker.
+    """
+    hits, misses = worker_step_cache.hits, worker_step_cache.misses
+    scenarios = match_feature_file(feature_file, worker_step_cache, **worker_options)
+    new_entries = worker_step_cache.new_entries
+    worker_step_cache.new_entries = {}
+    return scenarios, worker_step_cache.hits - hits, worker_step_cache.misses - misses, new_entries
+
+def load_manifest(manifest_path, definitions_hash, expand_outlines=False):
+    """
+    Load the per-file manifest written by the last incremental run.
+
+    Args:
+        manifest_path (str): The path to the manifest file.
+        definitions_hash (str): Hash of the current step definitions. Cached matches made with
+                                different definitions are discarded.
+        expand_outlines (bool): Whether outlines are expanded in this run. Cached scenarios made
+                                with the other setting are discarded.
+
+    Returns:
+        dict: The manifest entries keyed by feature file path, or an empty dict if there is nothing to reuse.
+    """
+    if not os.path.exists(manifest_path):
+        return {}
+
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable manifest {manifest_path}: {e}")
+        return {}
+
+    if manifest.get("definitions_hash") != definitions_hash:
+        print("Step definitions changed since the last run, reparsing all feature files")
+        return {}
+
+    if manifest.get("expand_outlines", False) != expand_outlines:
+        print("Scenario Outline expansion changed since the last run, reparsing all feature files")
+        return {}
+
+    return manifest.get("files", {})
+
+def feature_parser(base_dir, parsed_definitions, combined_directory='./data', cache_size=4096, cache_file=None, workers=1, output_format='json', incremental=False, quiet=False, reader='behave', expand_outlines=False, ignore_dirs=DEFAULT_IGNORE_DIRS):
     """
     Build the dataset of each test case and its corresponding glue code and step definitions.
 
     Args:
         base_dir (str): The base directory where the search for feature files will be conducted.
-        parsed_definitions (dict): Dictionary of step patterns and their glue code.
+        parsed_definitions (dict or DefinitionRegistry): Dictionary of step patterns and their glue code, or a
+                                                         registry of layered definitions whose precomputed
+                                                         pattern filters are reused by every matcher.
         combined_directory (str): The directory where the combined data file will be saved.
+        cache_size (int): Maximum number of step names kept in the resolution cache. 0 disables the cache.
+        cache_file (str): Optional file to persist the resolution cache between runs.
+        workers (int): Number of processes used to parse and match feature files. 1 parses them in this process.
+        output_format (str): 'json' writes one indented JSON array at the end, 'jsonl' writes one compact
+                             JSON object per scenario line as each feature file finishes.
+        incremental (bool): Only reparse feature files that are new or changed since the last incremental run,
+                            reusing the scenarios recorded in the manifest next to the output file.
+        quiet (bool): Don't print each feature file as it is found.
+        reader (str): 'behave' parses feature files with behave, 'gherkin' with the streaming reader,
+                      which gives the same scenarios without building behave's model.
+        expand_outlines (bool): Write one test case per Examples row of each Scenario Outline instead
+                                of one test case with the outline's template steps.
+        ignore_dirs (iterable): Directory names or globs that are not searched for feature files.
 
     Returns:
         None: This function saves the combined data to a specified file and does not return anything.
     """
-    feature_files = find_feature_files(base_dir)
+    feature_files = find_feature_files(base_dir, ignore_dirs, quiet=quiet)
+    if isinstance(parsed_definitions, DefinitionRegistry):
+        matcher = parsed_definitions.matcher()
+        parsed_definitions = parsed_definitions.definitions
+    else:
+        matcher = StepMatcher(parsed_definitions)
+    step_cache = ResolutionCache(matcher, parsed_definitions, cache_size, cache_file)
+
+    manifest_path = os.path.join(combined_directory, f'{os.path.basename(combined_directory)}_parsed_steps.manifest.json')
+    previous_manifest = load_manifest(manifest_path, step_cache.definitions_hash, expand_outlines) if incremental else {}
+    manifest = {}
+    cached_results = {}
+    fingerprints = {}
+    if incremental:
+        # every file is fingerprinted before parsing starts, otherwise files are parsed as they are found
+        feature_files = list(feature_files)
+        for feature_file in feature_files:
+            previous = previous_manifest.get(feature_file)
+            fingerprints[feature_file] = file_fingerprint(feature_file, previous)
+            if previous is not None and previous["sha256"] == fingerprints[feature_file]["sha256"]:
+                cached_results[feature_file] = previous["scenarios"]
+
+    file_name = f'{os.path.basename(combined_directory)}_parsed_steps.{output_format}'
+    json_file_path = os.path.join(combined_directory, file_name)
 
     combined_json = []
     total_test_cases = 0
     total_unmatched_steps = 0
     total_step_count = 0
-    for feature_file in feature_files:
-        print("----------------------------------------------------")
-        print("Processing file: ", feature_file)
-        feature = parse_file(feature_file)
+    # the pool and the .jsonl file are closed even if parsing a feature file or writing the output fails
+    with ExitStack() as stack:
+        jsonl_file = None
+        if output_format == 'jsonl':
+            # scenarios are streamed to a .partial file that only replaces the output once every file is written,
+            # so a failed run doesn't leave a truncated .jsonl behind
+            jsonl_file = stack.enter_context(open(json_file_path + '.partial', 'w'))
 
-        if feature is None:
-            continue
+        executor = None
+        if workers > 1:
+            executor = stack.enter_context(ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                                               initargs=(parsed_definitions, cache_size, cache_file, reader, expand_outlines, matcher.filters)))
+            # files are submitted as discovery finds them and their results read back in the same
+            # order, so the workers start before the walk has finished and the output is the same as a serial run
+            pending = [(feature_file, None if feature_file in cached_results else executor.submit(match_feature_file_worker, feature_file))
+                       for feature_file in feature_files]
+        else:
+            pending = ((feature_file, None) for feature_file in feature_files)
 
-        matched_steps = []
-        step_count = 0
-
-        for scenario in feature.scenarios:
-            total_test_cases += 1
-            matched_scenario = {}
-            step_num = 0
-            steps = []
-            # find the glue code for each step
-            for step in scenario.steps:
-                total_step_count += 1
-                step_count += 1
-                step_num += 1
-                definition = pattern_search(step.name, parsed_definitions)
-
-                if definition is None:
-                    definition = pattern_search(step.name+":", parsed_definitions)
-
-                matched_scenario[step.name] = definition
-                
-                if step.name in matched_scenario:
-                    step_definition = None if matched_scenario[step.name] is None else matched_scenario[step.name]['Code']
-                    step_definition_file = None if matched_scenario[step.name] is None else matched_scenario[step.name]['File']
-                    steps.append({
-                        "step_num": step_num,
-                        "step_name": step.name,
-                        "step_name_cleaned": replace_inputs_with_blank_quotes(step.name),
-                        "step_definition": step_definition,
-                        "step_definition_file": step_definition_file
-                    })
-
-                if matched_scenario[step.name] is None:
-                    print(f"Step number {step_num} with Step name {step.name} not matched.")
+        for feature_file, future in pending:
+            print("----------------------------------------------------")
+            print("Processing file: ", feature_file)
+
+            if feature_file in cached_results:
+                print("Unchanged since the last run, reusing cached scenarios")
+                result = cached_results[feature_file]
+            elif future is None:
+                result = match_feature_file(feature_file, step_cache, reader, expand_outlines)
+            else:
+                result, hits, misses, new_entries = future.result()
+                step_cache.hits += hits
+                step_cache.misses += misses
+                for step_name, index in new_entries.items():
+                    step_cache.store(step_name, index)
+
+            if incremental:
+                manifest[feature_file] = {**fingerprints[feature_file], "scenarios": result}
+
+            if result is None:
+                continue
+
+            matched_steps = []
+            step_count = 0
+
+            for scenario_name, steps, unmatched_steps in result:
+                total_test_cases += 1
+                total_step_count += len(steps)
+                step_count += len(steps)
+
+                for step_num, step_name in unmatched_steps:
+                    print(f"Step number {step_num} with Step name {step_name} not matched.")
                     total_unmatched_steps += 1
             
-            if not steps:
-                continue
+                if not steps:
+                    continue
             
-            matched_steps.append({
-                        "feature_file": os.path.basename(feature_file),
-                        "test_num": total_test_cases,
-                        "test_case": scenario.name,
-                        "steps": steps
-                    })
+                matched_steps.append({
+                            "feature_file": os.path.basename(feature_file),
+                            "test_num": total_test_cases,
+                            "test_case": scenario_name,
+                            "steps": steps
+                        })
             
-        combined_json.extend(matched_steps)
+            if jsonl_file is not None:
+                for matched_step in matched_steps:
+                    jsonl_file.write(json.dumps(matched_step, separators=(',', ':')) + "\n")
+            else:
+                combined_json.extend(matched_steps)
         
-        print(f"FINISHED PARSING '{feature_file}' FEATURE FILE")
-        print("Feature Steps: ",step_count)
-        print("Steps Parsed: ", len(matched_steps))
-        print("Test Cases Parsed: ", len(feature.scenarios))
-        print("----------------------------------------------------")
-        print("\n")
+            print(f"FINISHED PARSING '{feature_file}' FEATURE FILE")
+            print("Feature Steps: ",step_count)
+            print("Steps Parsed: ", len(matched_steps))
+            print("Test Cases Parsed: ", len(result))
+            print("----------------------------------------------------")
+            print("\n")
+
+    if jsonl_file is not None:
+        os.replace(json_file_path + '.partial', json_file_path)
     
     print("Total Test Cases: ", total_test_cases)
     print("Total Steps: ", total_step_count)
     print("Total Unmatched: ", total_unmatched_steps)
-    json_file_path = os.path.join(combined_directory, f'{os.path.basename(combined_directory)}_parsed_steps.json')
-    with open(json_file_path, 'w') as json_file:
-        json.dump(combined_json, json_file, indent=4)
+    print("Step Cache Hits: ", step_cache.hits)
+    print("Step Cache Misses: ", step_cache.misses)
+    step_cache.save()
+    if incremental:
+        print("Files Reparsed: ", len(feature_files) - len(cached_results))
+        print("Files Reused: ", len(cached_results))
+        # files that were deleted since the last run are not carried over
+        with open(manifest_path, 'w') as manifest_file:
+            json.dump({"definitions_hash": step_cache.definitions_hash, "expand_outlines": expand_outlines, "files": manifest}, manifest_file)
+    if jsonl_file is None:
+        with open(json_file_path, 'w') as json_file:
+            json.dump(combined_json, json_file, indent=4)
 
 if __name__ == "__main__":
     import argparse
@@ -143,18 +369,26 @@ if __name__ == "__main__":
     parser.add_argument("--aruba_definitions", default="./data/aruba/aruba_stepdefinitions.json", help="The JSON file with Aruba step definitions.")
     parser.add_argument("--cucumber_definitions", default="./data/cucumber-ruby/cucumber_stepdefinitions.json", help="The JSON file with Cucumber step definitions.")
     parser.add_argument("--output_dir", default="./data", help="The directory to save the combined data file.")
+    parser.add_argument("--cache_size", type=int, default=4096, help="Maximum number of step names in the resolution cache (0 disables it).")
+    parser.add_argument("--cache_file", default=None, help="Optional file to persist the step resolution cache between runs.")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes used to parse feature files.")
+    parser.add_argument("--format", choices=["json", "jsonl"], default="json", help="Write a single JSON array or one JSON scenario per line.")
+    parser.add_argument("--incremental", action="store_true", help="Only reparse feature files that changed since the last incremental run.")
+    parser.add_argument("--quiet", action="store_true", help="Don't print each feature file as it is found.")
+    parser.add_argument("--reader", choices=FEATURE_READERS, default="behave", help="Parse feature files with behave or the streaming Gherkin reader.")
+    parser.add_argument("--expand-outlines", action="store_true", help="Write one test case per Examples row of each Scenario Outline.")
+    parser.add_argument("--ignore", nargs="*", default=list(DEFAULT_IGNORE_DIRS), help="Directory names or globs to skip when searching for feature files (default: vendor node_modules .git, pass --ignore with no values to search everything).")
+    parser.add_argument("--definition_cache_dir", default="./data/definition_cache", help="Directory of the compiled step definition caches (empty to disable).")
 
     args = parser.parse_args()
 
-    with open(args.step_definition_file) as f:
-        parsed_steps_file = json.load(f)
-    
-    with open(args.aruba_definitions) as f:
-        aruba_steps_file = json.load(f)
-    
-    with open(args.cucumber_definitions) as f:
-        cucumber_steps_file = json.load(f)
-    
-    combined_steps = {**parsed_steps_file, **aruba_steps_file, **cucumber_steps_file}
+    # project definitions take precedence over Aruba's, which take precedence over Cucumber's
+    definition_cache_dir = args.definition_cache_dir or None
+    combined_steps = DefinitionRegistry([
+        DefinitionLayer.from_file("project", args.step_definition_file, definition_cache_dir),
+        DefinitionLayer.from_file("aruba", args.aruba_definitions, definition_cache_dir),
+        DefinitionLayer.from_file("cucumber", args.cucumber_definitions, definition_cache_dir),
+    ])
+    combined_steps.report()
 
-    feature_parser(args.base_dir, combined_steps, args.output_dir)
\ No newline at end of file
+    feature_parser(args.base_dir, combined_steps, args.output_dir, args.cache_size, args.cache_file, args.workers, args.format, args.incremental, args.quiet, args.reader, args.expand_outlines, args.ignore)
\ No newline at end of file
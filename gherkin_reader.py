@@ -0,0 +1,462 @@
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+import os
+import re
+import time
+from discovery import DEFAULT_IGNORE_DIRS, discover_files
+
+# The English Gherkin keywords, the same as behave.i18n.languages["en"]
+ENGLISH_KEYWORDS = {
+    "and": ["* ", "And "],
+    "background": ["Background"],
+    "but": ["* ", "But "],
+    "examples": ["Examples", "Scenarios"],
+    "feature": ["Feature", "Business Need", "Ability"],
+    "given": ["* ", "Given "],
+    "rule": ["Rule"],
+    "scenario": ["Example", "Scenario"],
+    "scenario_outline": ["Scenario Outline", "Scenario Template"],
+    "then": ["* ", "Then "],
+    "when": ["* ", "When "],
+}
+STEP_TYPES = ("given", "when", "then", "and", "but")
+DOC_STRING_DELIMITERS = ('"""', "'''")
+# Table cells are separated by pipes that are not escaped
+CELL_SEPARATOR_RE = re.compile(r"(?<!\\)\|")
+
+class GherkinSyntaxError(ValueError):
+    """A feature file line the reader (and behave) cannot parse."""
+
+    def __init__(self, message: str, feature_file: str, line_number: int, line: str=""):
+        super().__init__(f"{feature_file}:{line_number}: {message}: {line.strip()!r}")
+        self.feature_file = feature_file
+        self.line_number = line_number
+
+class ExamplesTable(NamedTuple):
+    """An Examples block of a Scenario Outline."""
+    name: str
+    headings: List[str]
+    rows: List[List[str]]
+
+class ScenarioRecord(NamedTuple):
+    """
+    A scenario of a feature file.
+
+    steps holds the text of each step without its keyword, doc string or data table. examples is
+    None for a plain Scenario and the Examples blocks of a Scenario Outline.
+    """
+    feature_file: str
+    name: str
+    steps: List[str]
+    examples: Optional[List[ExamplesTable]]
+
+def language_keywords(language: str) -> Dict[str, List[str]]:
+    """Return the Gherkin keywords of a language, using behave's translations for languages other than English."""
+    if language == "en":
+        return ENGLISH_KEYWORDS
+    from behave.i18n import languages
+    return languages[language]
+
+def step_keywords(keywords: Dict[str, List[str]]) -> List[tuple]:
+    """List the (step type, keyword, lowercase keyword) of every step keyword, in the order behave tries them."""
+    return [(step_type, keyword, keyword.lower()) for step_type in STEP_TYPES for keyword in keywords[step_type]]
+
+def split_table_row(line: str) -> List[str]:
+    """Split a stripped "| a | b |" table row into its cells, unescaping escaped pipes."""
+    return [cell.replace("\\|", "|").strip() for cell in CELL_SEPARATOR_RE.split(line[1:-1])]
+
+class GherkinScanner:
+    """
+    Line based Gherkin scanner that keeps only scenario names and step text.
+
+    It follows the states of behave's parser, so it accepts and rejects the same files and yields
+    the same scenarios as feature.scenarios of behave.parser.parse_file: scenarios nested under a
+    Rule and Background steps are not yielded, and outlines are yielded with their template steps.
+    No model objects are built for features, steps, tags, tables or doc strings.
+    """
+
+    def __init__(self, feature_file: str, language: Optional[str]=None):
+        """
+        Args:
+            feature_file (str): The name of the feature file, used in the records and error messages.
+            language (str): The language of the keywords. Defaults to a "# language:" comment, or English.
+        """
+        self.feature_file = feature_file
+        self.keywords = None
+        self.step_keywords = None
+        if language:
+            self.set_language(language)
+        self.state = "initial"
+        self.line_number = 0
+        self.has_tags = False
+        # the scenario being read, only kept for scenarios directly under the feature
+        self.scenario = None
+        self.finished = []
+        # (kind, steps, examples) of the Background, Scenario or Scenario Outline being read
+        self.statement = None
+        self.in_rule = False
+        self.background_has_steps = {"feature": False, "rule": False}
+        self.last_step_type = None
+        self.doc_string_delimiter = None
+        self.doc_string_indent = 0
+        self.table_rows = None
+        self.table_width = 0
+        self.examples = None
+
+    def scan(self, lines: Iterable[str]) -> Iterator[ScenarioRecord]:
+        """
+        Scan the lines of a feature file, yielding each scenario once all of its lines have been read.
+
+        Raises:
+            GherkinSyntaxError: If a line can't be parsed.
+        """
+        for line in lines:
+            self.line_number += 1
+            if self.state != "doc_string" and not line.strip():
+                continue
+            if self.state != "doc_string" and line.strip().startswith("#"):
+                self.comment(line)
+                continue
+
+            if not getattr(self, f"action_{self.state}")(line):
+                raise GherkinSyntaxError(f"Parser failure in state {self.state}", self.feature_file, self.line_number, line)
+
+            if self.finished:
+                yield from self.finished
+                self.finished = []
+
+        if self.table_rows is not None:
+            self.action_table("")
+        self.finish_scenario()
+        yield from self.finished
+
+    def finish_scenario(self) -> None:
+        """Queue the scenario being read to be yielded, since no more lines can belong to it."""
+        if self.scenario is not None:
+            self.finished.append(self.scenario)
+            self.scenario = None
+
+    def comment(self, line: str) -> None:
+        """Skip a comment line, picking up a "# language:" comment before the feature."""
+        if self.state != "initial" or self.has_tags:
+            return
+        text = line.strip()[1:].strip()
+        if text.lower().startswith("language:"):
+            self.set_language(text[9:].strip())
+
+    def set_language(self, language: str) -> None:
+        self.keywords = language_keywords(language)
+        self.step_keywords = step_keywords(self.keywords)
+
+    def match_keyword(self, keyword: str, line: str) -> Optional[str]:
+        """Return the alias of the keyword the stripped line starts with, followed by a colon."""
+        if self.keywords is None:
+            self.set_language("en")
+        for alias in self.keywords[keyword]:
+            if line.startswith(alias + ":"):
+                return alias
+        return None
+
+    def match_step(self, line: str) -> Optional[str]:
+        """Return the text of a step line without its keyword, or None if the line is not a step."""
+        if self.keywords is None:
+            self.set_language("en")
+        lower_line = line.lower()
+        for step_type, keyword, lower_keyword in self.step_keywords:
+            if not (line.startswith(keyword) or lower_line.startswith(lower_keyword)):
+                continue
+
+            if keyword.startswith("*") and self.last_step_type:
+                pass
+            elif step_type in ("and", "but"):
+                # And/But need a previous step, or at least a Background step to continue from
+                if not self.last_step_type:
+                    background_has_steps = self.background_has_steps["feature"]
+                    if self.in_rule:
+                        # a Rule's Background inherits the steps of the feature's Background
+                        background_has_steps = background_has_steps or self.background_has_steps["rule"]
+                    if not background_has_steps:
+                        raise GherkinSyntaxError(f"{step_type.upper()}-STEP requires a previous Given/When/Then step",
+                                                 self.feature_file, self.line_number, line)
+                    self.last_step_type = step_type
+            else:
+                self.last_step_type = step_type
+            return line[len(keyword):].strip()
+        return None
+
+    def start_statement(self, kind: str, name: str="") -> None:
+        """Start a Background, Scenario or Scenario Outline, or a Rule with kind "rule"."""
+        self.has_tags = False
+        self.finish_scenario()
+        if kind == "rule":
+            self.in_rule = True
+            self.background_has_steps["rule"] = False
+            self.statement = None
+            return
+
+        steps = []
+        examples = [] if kind == "outline" else None
+        self.statement = (kind, steps, examples)
+        if kind != "background" and not self.in_rule:
+            self.scenario = ScenarioRecord(self.feature_file, name, steps, examples)
+
+    def add_step(self, text: str) -> None:
+        kind, steps, _ = self.statement
+        steps.append(text)
+        if kind == "background":
+            self.background_has_steps["rule" if self.in_rule else "feature"] = True
+
+    def detect_taggable_statement(self, line: str) -> bool:
+        """Handle tags, Rule, Scenario, Scenario Outline and Examples lines, returning False for any other line."""
+        if line.startswith("@"):
+            self.parse_tags(line)
+            self.state = "taggable_statement"
+            return True
+
+        keyword = self.match_keyword("rule", line)
+        if keyword:
+            self.start_statement("rule")
+            self.state = "rule"
+            return True
+
+        for kind, keyword_type in (("scenario", "scenario"), ("outline", "scenario_outline")):
+            keyword = self.match_keyword(keyword_type, line)
+            if keyword:
+                self.start_statement(kind, line[len(keyword) + 1:].strip())
+                self.state = "scenario"
+                return True
+
+        keyword = self.match_keyword("examples", line)
+        if keyword:
+            if self.statement is None or self.statement[0] != "outline":
+                raise GherkinSyntaxError("Examples must only appear inside scenario outline", self.feature_file, self.line_number, line)
+            self.has_tags = False
+            self.examples = ExamplesTable(line[len(keyword) + 1:].strip(), [], [])
+            self.statement[2].append(self.examples)
+            self.state = "table"
+            return True
+        return False
+
+    def parse_tags(self, line: str) -> None:
+        for word in line.split():
+            if word.startswith("#"):
+                break
+            if not word.startswith("@"):
+                raise GherkinSyntaxError("Bad tag", self.feature_file, self.line_number, line)
+        self.has_tags = True
+
+    def detect_background(self, line: str) -> bool:
+        keyword = self.match_keyword("background", line)
+        if not keyword:
+            return False
+        if self.has_tags:
+            raise GherkinSyntaxError("Background supports no tags", self.feature_file, self.line_number, line)
+        if self.background_has_steps["rule" if self.in_rule else "feature"]:
+            raise GherkinSyntaxError("Second Background (can have only one)", self.feature_file, self.line_number, line)
+        self.start_statement("background")
+        self.state = "background"
+        return True
+
+    def action_initial(self, line: str) -> bool:
+        line = line.strip()
+        if line.startswith("@"):
+            self.parse_tags(line)
+            return True
+        if self.match_keyword("feature", line):
+            self.has_tags = False
+            self.state = "feature"
+            return True
+        return False
+
+    def action_feature(self, line: str) -> bool:
+        line = line.strip()
+        # any other line is part of the feature description
+        return self.detect_taggable_statement(line) or self.detect_background(line) or True
+
+    action_rule = action_feature
+
+    def action_taggable_statement(self, line: str) -> bool:
+        return self.detect_taggable_statement(line.strip())
+
+    def action_scenario(self, line: str) -> bool:
+        self.last_step_type = None
+        line = line.strip()
+        step = self.match_step(line)
+        if step is not None:
+            self.add_step(step)
+            self.state = "steps"
+            return True
+        # any other line is part of the scenario description
+        return self.detect_taggable_statement(line) or True
+
+    action_background = action_scenario
+
+    def action_steps(self, line: str) -> bool:
+        stripped = line.lstrip()
+        if stripped.startswith(DOC_STRING_DELIMITERS):
+            if not self.statement or not self.statement[1]:
+                raise GherkinSyntaxError("Multi-line text before any step", self.feature_file, self.line_number, line)
+            self.state = "doc_string"
+            self.doc_string_delimiter = stripped[:3]
+            self.doc_string_indent = line.index(stripped[0])
+            return True
+
+        line = line.strip()
+        step = self.match_step(line)
+        if step is not None:
+            self.add_step(step)
+            return True
+
+        if self.detect_taggable_statement(line):
+            return True
+
+        if line.startswith("|"):
+            if not self.statement or not self.statement[1]:
+                raise GherkinSyntaxError("TABLE-START without step detected", self.feature_file, self.line_number, line)
+            self.state = "table"
+            return self.action_table(line)
+        return False
+
+    def action_doc_string(self, line: str) -> bool:
+        if line.strip().startswith(self.doc_string_delimiter):
+            self.state = "steps"
+            return True
+        if line[:self.doc_string_indent].strip():
+            raise GherkinSyntaxError("BAD-INDENT in multiline text", self.feature_file, self.line_number, line)
+        return True
+
+    def action_table(self, line: str) -> bool:
+        line = line.strip()
+        if not line.startswith("|"):
+            # the end of a step's data table or of an Examples table
+            self.examples = None
+            self.table_rows = None
+            self.state = "steps"
+            return self.action_steps(line)
+
+        cells = split_table_row(line)
+        if self.table_rows is None:
+            self.table_rows = []
+            if self.examples is not None:
+                self.examples.headings.extend(cells)
+            self.table_width = len(cells)
+        else:
+            if len(cells) != self.table_width:
+                raise GherkinSyntaxError("Malformed table", self.feature_file, self.line_number, line)
+            if self.examples is not None:
+                self.examples.rows.append(cells)
+            self.table_rows.append(cells)
+        return True
+
+def is_parametrized(text: str) -> bool:
+    """Check whether a Scenario Outline name or step may contain <placeholders>."""
+    return "<" in text and ">" in text
+
+def render_template(text: str, values: List[tuple]) -> str:
+    """Replace the <name> placeholders in the text with the (name, value) pairs in order, like behave."""
+    if not is_parametrized(text):
+        return text
+    for name, value in values:
+        text = text.replace(f"<{name}>", value)
+    return text
+
+def expand_outline(name: str, steps: List[str], examples: List[ExamplesTable]) -> Iterator[Tuple[str, List[str]]]:
+    """
+    Lazily expand a Scenario Outline into one scenario per Examples row.
+
+    Scenario names and steps are rendered the same way as behave's ScenarioOutlineBuilder, e.g.
+    "Outline name -- @1.2 Examples name" for the second row of the first Examples block.
+
+    Yields:
+        tuple: The scenario name and the step texts of each row.
+    """
+    for examples_index, table in enumerate(examples, start=1):
+        for row_index, cells in enumerate(table.rows, start=1):
+            row = list(zip(table.headings, cells))
+            row_id = f"{examples_index}.{row_index}"
+            params = [("examples.name", table.name or ""), ("examples.index", str(examples_index)),
+                      ("row.index", str(row_index)), ("row.id", row_id)]
+            examples_name = render_template(table.name, row + params)
+            params[0] = ("examples.name", examples_name)
+            values = row + params
+            yield f"{render_template(name, values)} -- @{row_id} {examples_name}", [render_template(step, values) for step in steps]
+
+def read_feature_file(feature_file: str, language: Optional[str]=None) -> Iterator[ScenarioRecord]:
+    """
+    Yield the scenarios of a feature file with the text of their steps.
+
+    Args:
+        feature_file (str): The path to the feature file.
+        language (str): The language of the keywords. Defaults to a "# language:" comment, or English.
+
+    Yields:
+        ScenarioRecord: (feature_file, scenario name, step texts, examples) for each scenario.
+    """
+    with open(feature_file, 'rb') as f:
+        # behave reads feature files as UTF-8 and splits them the same way
+        text = f.read().decode('utf8')
+    yield from GherkinScanner(feature_file, language).scan(text.splitlines())
+
+def behave_scenarios(feature_file: str) -> List[tuple]:
+    """Return the (scenario name, step names) of each scenario as read by behave."""
+    from behave.parser import parse_file
+    feature = parse_file(feature_file)
+    if feature is None:
+        return []
+    return [(scenario.name, [step.name for step in scenario.steps]) for scenario in feature.scenarios]
+
+def reader_scenarios(feature_file: str) -> List[tuple]:
+    """Return the (scenario name, step texts) of each scenario as read by read_feature_file."""
+    return [(record.name, record.steps) for record in read_feature_file(feature_file)]
+
+def compare_readers(base_dir: str, ignore_dirs: Iterable[str]=DEFAULT_IGNORE_DIRS, repeat: int=3) -> dict:
+    """
+    Time behave and the streaming reader on every feature file under base_dir and check they agree.
+
+    Args:
+        base_dir (str): The directory to search for feature files.
+        ignore_dirs (iterable): Directory names or globs that are not searched.
+        repeat (int): Number of passes over the files, the fastest pass is reported.
+
+    Returns:
+        dict: The number of files, scenarios and steps, the best seconds of each reader, and the
+              files whose scenarios or steps differ.
+    """
+    feature_files = list(discover_files(base_dir, ".feature", ignore_dirs, quiet=True))
+    results = {}
+    seconds = {}
+    for name, read in (("behave", behave_scenarios), ("gherkin", reader_scenarios)):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            results[name] = [read(feature_file) for feature_file in feature_files]
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        seconds[name] = best
+
+    mismatches = [feature_file for feature_file, expected, actual in zip(feature_files, results["behave"], results["gherkin"])
+                  if expected != actual]
+    return {
+        "files": len(feature_files),
+        "bytes": sum(os.path.getsize(feature_file) for feature_file in feature_files),
+        "scenarios": sum(len(scenarios) for scenarios in results["behave"]),
+        "steps": sum(len(steps) for scenarios in results["behave"] for _, steps in scenarios),
+        "seconds": seconds,
+        "mismatches": mismatches,
+    }
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Compare the streaming Gherkin reader against behave on feature files.")
+    parser.add_argument("base_dirs", nargs="+", help="Directories to search for feature files, e.g. one per project.")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed passes, the fastest is reported (default: 3)")
+    args = parser.parse_args()
+
+    print(f"{'Suite':<32}{'Files':>7}{'Scenarios':>11}{'behave files/s':>16}{'reader files/s':>16}{'Speedup':>9}{'Identical':>11}")
+    for base_dir in args.base_dirs:
+        report = compare_readers(base_dir, repeat=args.repeat)
+        behave_seconds, reader_seconds = report["seconds"]["behave"], report["seconds"]["gherkin"]
+        print(f"{base_dir:<32}{report['files']:>7}{report['scenarios']:>11}"
+              f"{report['files'] / behave_seconds:>16.0f}{report['files'] / reader_seconds:>16.0f}"
+              f"{behave_seconds / reader_seconds:>8.1f}x{'yes' if not report['mismatches'] else 'NO':>11}")
+        for feature_file in report["mismatches"]:
+            print(f"  differs: {feature_file}")
@@ -61,25 +61,60 @@ function parser(code, filePath, result) {
   });
 }
 
-const feature_directory = path.resolve(
-  __dirname,
-  "../repos/aws-sdk-js/features"
-);
-const stepDefinitions = findJsFilesInStepDefinitions(feature_directory);
-stepDefinitions.push("../repos/aws-sdk-js/features/extra/hooks.js");
+// Long-lived worker: reads one JSON request per line on stdin, {"file": path} with an
+// optional "source", and writes one JSON line {"file": path, "steps": {...}} per request.
+function worker() {
+  const readline = require("readline");
+  // Keep stdout for responses and send all diagnostics to stderr
+  console.log = console.error;
 
-const result = {};
+  const lines = readline.createInterface({ input: process.stdin });
+  lines.on("line", (line) => {
+    if (!line.trim()) {
+      return;
+    }
 
-stepDefinitions.forEach((filePath) => {
-  const code = fs.readFileSync(filePath, "utf-8");
-  parser(code, filePath, result);
-});
+    let filePath = null;
+    const steps = {};
+    try {
+      const request = JSON.parse(line);
+      filePath = request.file;
+      const code = request.source || fs.readFileSync(filePath, "utf-8");
+      parser(code, filePath, steps);
+    } catch (e) {
+      console.error(`Error parsing file ${filePath}: ${e.message}`);
+    }
+    process.stdout.write(JSON.stringify({ file: filePath, steps: steps }) + "\n");
+  });
+}
+
+function main() {
+  const feature_directory = path.resolve(
+    __dirname,
+    "../repos/aws-sdk-js/features"
+  );
+  const stepDefinitions = findJsFilesInStepDefinitions(feature_directory);
+  stepDefinitions.push("../repos/aws-sdk-js/features/extra/hooks.js");
 
-// Write result to a JSON file
-const outputFilePath = path.join(
-  __dirname,
-  "../data/aws-sdk-js/parsed_stepdefinitions.json"
-);
-fs.writeFileSync(outputFilePath, JSON.stringify(result, null, 2), "utf-8");
+  const result = {};
+
+  stepDefinitions.forEach((filePath) => {
+    const code = fs.readFileSync(filePath, "utf-8");
+    parser(code, filePath, result);
+  });
 
-console.log(`Parsed functions have been written to ${outputFilePath}`);
+  // Write result to a JSON file
+  const outputFilePath = path.join(
+    __dirname,
+    "../data/aws-sdk-js/parsed_stepdefinitions.json"
+  );
+  fs.writeFileSync(outputFilePath, JSON.stringify(result, null, 2), "utf-8");
+
+  console.log(`Parsed functions have been written to ${outputFilePath}`);
+}
+
+if (process.argv[2] === "--worker") {
+  worker();
+} else {
+  main();
+}
@@ -0,0 +1,187 @@
+import zlib
+import time
+import numpy as np
+from analysis_funcs import (stringify_test_cases, create_tfidf_matrix, make_compressor,
+                            compress_strings, calculate_cosine_similarity)
+
+MINHASH_PRIME = 4294967311  # smallest prime above 2**32
+
+def shingles(test_string, shingle_size=3):
+    """Split a string into word shingles and hash each one to a 32-bit integer."""
+    words = test_string.split()
+    if not words:
+        return np.zeros(0, dtype=np.uint64)
+    if len(words) < shingle_size:
+        grams = [" ".join(words)]
+    else:
+        grams = [" ".join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)]
+    return np.unique(np.array([zlib.crc32(gram.encode()) for gram in grams], dtype=np.uint64))
+
+class MinHasher:
+    """Build MinHash signatures of strings from their word shingles."""
+
+    def __init__(self, num_perm=128, shingle_size=3, seed=42):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        # a < 2**31 keeps a * x + b below 2**64 for 32-bit shingle hashes
+        self.a = rng.integers(1, 2**31, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 2**31, size=num_perm, dtype=np.uint64)
+
+    def signature(self, test_string):
+        """Return the MinHash signature of a string. Empty strings get a signature that matches nothing else."""
+        hashes = shingles(test_string, self.shingle_size)
+        if hashes.size == 0:
+            return np.full(self.num_perm, np.iinfo(np.uint64).max, dtype=np.uint64)
+        permuted = (self.a[:, None] * hashes[None, :] + self.b[:, None]) % MINHASH_PRIME
+        return permuted.min(axis=1)
+
+    def signatures(self, test_strings):
+        """Return the (n, num_perm) MinHash signatures of the strings."""
+        return np.array([self.signature(test_string) for test_string in test_strings], dtype=np.uint64).reshape(len(test_strings), self.num_perm)
+
+class LSHIndex:
+    """
+    Locality sensitive hashing index over MinHash signatures using banding.
+
+    Signatures are split into bands of rows; scenarios that share any band bucket become candidate
+    pairs. Pairs with Jaccard similarity above roughly (1 / bands) ** (1 / rows) are likely to be found.
+    """
+
+    def __init__(self, bands=32, rows=4):
+        self.bands = bands
+        self.rows = rows
+        self.buckets = [{} for _ in range(bands)]
+        self.size = 0
+
+    def add(self, signatures):
+        """Add the signatures of scenarios, numbered after the ones already in the index."""
+        if signatures.shape[1] < self.bands * self.rows:
+            raise ValueError(f"Signatures need at least {self.bands * self.rows} permutations, got {signatures.shape[1]}.")
+
+        empty = np.iinfo(np.uint64).max
+        for offset, signature in enumerate(signatures):
+            if signature[0] == empty:
+                continue
+            for band, buckets in enumerate(self.buckets):
+                key = signature[band * self.rows:(band + 1) * self.rows].tobytes()
+                buckets.setdefault(key, []).append(self.size + offset)
+        self.size += len(signatures)
+
+    def candidate_pairs(self):
+        """Return the set of (i, j) candidate pairs with i < j."""
+        pairs = set()
+        for buckets in self.buckets:
+            for members in buckets.values():
+                for position, i in enumerate(members):
+                    for j in members[position + 1:]:
+                        pairs.add((i, j))
+        return pairs
+
+def find_candidate_pairs(test_data, view="step_name", num_perm=128, bands=32, rows=4, shingle_size=3):
+    """
+    Find candidate near-duplicate scenario pairs of a view with MinHash and LSH.
+
+    Args:
+        test_data (list): The parsed test cases.
+        view (str): "step_name", "step_name_cleaned" or "step_definition".
+
+    Returns:
+        list: Sorted (i, j) candidate pairs with i < j.
+    """
+    test_strings = stringify_test_cases(test_data, view)
+    signatures = MinHasher(num_perm, shingle_size).signatures(test_strings)
+    index = LSHIndex(bands, rows)
+    index.add(signatures)
+    return sorted(index.candidate_pairs())
+
+def score_candidate_pairs(test_strings, pairs, metric="cosine", compressor="zlib", level=None):
+    """
+    Score only the candidate pairs with an exact metric.
+
+    Args:
+        test_strings (list): The strings of the view.
+        pairs (list): The (i, j) pairs to score.
+        metric (str): "cosine" (TF-IDF cosine similarity) or "ncd".
+
+    Returns:
+        np.ndarray: The score of each pair.
+    """
+    if not pairs:
+        return np.zeros(0)
+    first, second = (np.array(indices) for indices in zip(*pairs))
+
+    if metric == "cosine":
+        # TF-IDF rows are L2 normalised, so the cosine similarity is the dot product
+        tfidf_matrix = create_tfidf_matrix(test_strings).tocsr()
+        return np.asarray(tfidf_matrix[first].multiply(tfidf_matrix[second]).sum(axis=1)).ravel()
+
+    if metric == "ncd":
+        compress = make_compressor(compressor, level, test_strings)
+        encoded_strings, compressed_lengths = compress_strings(test_strings, compress)
+        scores = np.full(len(pairs), float('inf'))
+        for position, (i, j) in enumerate(pairs):
+            if compressed_lengths[i] is None or compressed_lengths[j] is None:
+                continue
+            combined = len(compress(encoded_strings[min(i, j)] + encoded_strings[max(i, j)]))
+            scores[position] = (combined - min(compressed_lengths[i], compressed_lengths[j])) / (compressed_lengths[i] + compressed_lengths[j])
+        return scores
+
+    raise ValueError(f"Unknown metric {metric!r}, expected 'cosine' or 'ncd'.")
+
+def recall_report(test_data, view="step_name", threshold=0.8, num_perm=128, bands=32, rows=4):
+    """
+    Compare LSH candidates against the exact cosine matrix.
+
+    Returns:
+        dict: The number of scenarios, true pairs (cosine >= threshold), candidates, recall, and the
+              time of the exact matrix versus LSH plus scoring the candidates.
+    """
+    test_strings = stringify_test_cases(test_data, view)
+
+    start = time.perf_counter()
+    similarity_matrix = calculate_cosine_similarity(test_strings)
+    exact_seconds = time.perf_counter() - start
+    first, second = np.nonzero(np.triu(similarity_matrix >= threshold, k=1))
+    true_pairs = set(zip(first.tolist(), second.tolist()))
+
+    start = time.perf_counter()
+    pairs = find_candidate_pairs(test_data, view, num_perm, bands, rows)
+    scores = score_candidate_pairs(test_strings, pairs)
+    found = {pair for pair, score in zip(pairs, scores) if score >= threshold}
+    lsh_seconds = time.perf_counter() - start
+
+    num_test_cases = len(test_strings)
+    return {
+        "scenarios": num_test_cases,
+        "all_pairs": num_test_cases * (num_test_cases - 1) // 2,
+        "true_pairs": len(true_pairs),
+        "candidates": len(pairs),
+        "recall": len(found & true_pairs) / len(true_pairs) if true_pairs else 1.0,
+        "exact_seconds": exact_seconds,
+        "lsh_seconds": lsh_seconds,
+    }
+
+if __name__ == "__main__":
+    import argparse
+    from analysis_funcs import read_test_cases
+    from benchmark_ncd import find_datasets
+
+    parser = argparse.ArgumentParser(description="Report MinHash/LSH near-duplicate recall against exact cosine similarity.")
+    parser.add_argument("--data-dir", type=str, default="./data", help="Directory with one folder of parsed steps per project (default: ./data)")
+    parser.add_argument("--threshold", type=float, default=0.8, help="Cosine similarity of a near-duplicate pair (default: 0.8)")
+    parser.add_argument("--bands", type=int, default=32, help="Number of LSH bands (default: 32)")
+    parser.add_argument("--rows", type=int, default=4, help="Signature rows per band (default: 4)")
+    args = parser.parse_args()
+
+    datasets = {project: list(read_test_cases(data_file)) for project, data_file in find_datasets(args.data_dir).items()}
+    datasets["all"] = [test_case for test_data in datasets.values() for test_case in test_data]
+
+    print(f"{'Project':<15}{'View':<20}{'Scenarios':>10}{'True':>8}{'Candidates':>12}{'Recall':>8}{'Exact s':>9}{'LSH s':>9}")
+    for project, test_data in datasets.items():
+        for view in ("step_name", "step_name_cleaned", "step_definition"):
+            if not all(view in step for test_case in test_data for step in test_case["steps"]):
+                continue
+            report = recall_report(test_data, view, args.threshold, args.bands * args.rows, args.bands, args.rows)
+            print(f"{project:<15}{view:<20}{report['scenarios']:>10}{report['true_pairs']:>8}{report['candidates']:>12}"
+                  f"{report['recall']:>8.3f}{report['exact_seconds']:>9.2f}{report['lsh_seconds']:>9.2f}")
\ No newline at end of file
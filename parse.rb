@@ -111,22 +111,25 @@ def parser(code, file_path, result)
   result.merge!(steps)
 end
 
+def read_file(file_path)
+  File.read(file_path)
+rescue Errno::ENOENT
+  puts "File not found: #{file_path}"
+  nil
+rescue Errno::EACCES
+  puts "Permission denied reading file: #{file_path}"
+  nil
+rescue StandardError => e
+  puts "Error reading file #{file_path}: #{e.message}"
+  nil
+end
+
 def main(files_with_step_definitions, output_dir)
   result = {}
 
   files_with_step_definitions.each do |file_path|
-    begin
-      code = File.read(file_path)
-    rescue Errno::ENOENT
-      puts "File not found: #{file_path}"
-      next
-    rescue Errno::EACCES
-      puts "Permission denied reading file: #{file_path}"
-      next
-    rescue StandardError => e
-      puts "Error reading file #{file_path}: #{e.message}"
-      next
-    end
+    code = read_file(file_path)
+    next if code.nil?
 
     parser(code, file_path, result)
   end
@@ -150,9 +153,51 @@ def main(files_with_step_definitions, output_dir)
   end
 end
 
+# Long-lived worker: reads one JSON request per line on stdin, {"file": path} with an
+# optional "source", and writes one JSON line {"file": path, "steps": {...}} per request.
+def worker
+  # Keep stdout for responses and send all diagnostics to stderr
+  responses = $stdout.dup
+  responses.sync = true
+  $stdout = $stderr
+
+  $stdin.each_line do |line|
+    next if line.strip.empty?
+
+    begin
+      request = JSON.parse(line)
+    rescue JSON::ParserError => e
+      puts "Invalid worker request: #{e.message}"
+      responses.puts(JSON.generate({ "file" => nil, "steps" => {} }))
+      next
+    end
+
+    # A failure on one file (e.g. JSON::GeneratorError on a non UTF-8 source) answers it with no
+    # steps, like the one-shot mode, instead of killing the worker for the rest of the run
+    file_path = request.is_a?(Hash) ? request["file"] : nil
+    begin
+      code = request["source"] || read_file(file_path)
+      steps = {}
+      parser(code, file_path, steps) unless code.nil?
+      response = JSON.generate({ "file" => file_path, "steps" => steps })
+    rescue StandardError => e
+      puts "Error processing file #{file_path}: #{e.class}: #{e.message}"
+      response = JSON.generate({ "file" => file_path, "steps" => {} })
+    end
+
+    responses.puts(response)
+  end
+end
+
+if ARGV.first == '--worker'
+  worker
+  exit 0
+end
+
 # Ensure the script is run with the correct arguments
 if ARGV.length < 2
   puts "Usage: ruby script.rb <step_definition_files> <output_directory>"
+  puts "       ruby script.rb --worker"
   exit 1
 end
 
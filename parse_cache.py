@@ -0,0 +1,103 @@
+from typing import Dict, Iterable, Optional
+import os
+import json
+import hashlib
+from discovery import file_fingerprint
+
+def parser_version(scripts: Iterable[str], **settings) -> str:
+    """
+    Hash the parser sources and settings that produce the cached step maps.
+
+    Args:
+        scripts (iterable): The files whose contents decide the parse results, e.g. parse.rb and step_tokenizer.py.
+        settings: Options that change which parser handles a file, e.g. fast_path.
+
+    Returns:
+        str: A hex digest that changes whenever any of the files or settings change.
+    """
+    digest = hashlib.sha256()
+    for script in scripts:
+        try:
+            with open(script, 'rb') as f:
+                digest.update(f.read())
+        except OSError:
+            digest.update(f"missing {script}".encode())
+        digest.update(b"\0")
+    digest.update(json.dumps(settings, sort_keys=True).encode())
+    return digest.hexdigest()
+
+class ParseCache:
+    """
+    Per-file cache of step definition scan and parse results, keyed by each file's content hash.
+
+    Shared by step_finder (whether a file has step definitions) and step_parser (the file's
+    {regex: {"Code", "File"}} step map), so unchanged files are neither rescanned nor sent to Ruby.
+    Step maps are also keyed by the parser version they were made with, so they are parsed again
+    when the parsers or their settings change, even if the file itself hasn't.
+    """
+
+    def __init__(self, cache_file: Optional[str]=None, parser_version: Optional[str]=None):
+        """
+        Args:
+            cache_file (str): Optional JSON file to persist the cache between runs.
+            parser_version (str): The parser_version of this run's parsers. Step maps cached with another version are ignored.
+        """
+        self.cache_file = cache_file
+        self.parser_version = parser_version
+        self.entries = {}
+        self.fingerprints = {}
+        self.hits = 0
+        self.misses = 0
+
+        if cache_file is not None and os.path.exists(cache_file):
+            try:
+                with open(cache_file, encoding='utf-8') as f:
+                    self.entries = json.load(f).get("files", {})
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable parse cache {cache_file}: {e}")
+
+    def entry(self, file_path: str) -> dict:
+        """Return the cache entry for the file, starting a fresh one if the file changed."""
+        previous = self.entries.get(file_path)
+        if file_path not in self.fingerprints:
+            self.fingerprints[file_path] = file_fingerprint(file_path, previous)
+        fingerprint = self.fingerprints[file_path]
+
+        if previous is None or previous["sha256"] != fingerprint["sha256"]:
+            previous = self.entries[file_path] = dict(fingerprint)
+        else:
+            previous.update(fingerprint)
+        return previous
+
+    def has_step_definitions(self, file_path: str, scan) -> bool:
+        """Return whether the file has step definitions, calling scan(file_path) only if it changed."""
+        entry = self.entry(file_path)
+        if "has_step_definitions" not in entry:
+            entry["has_step_definitions"] = scan(file_path)
+        return entry["has_step_definitions"]
+
+    def steps(self, file_path: str) -> Optional[Dict[str, dict]]:
+        """Return the cached step map of the file, or None if it has to be parsed again."""
+        entry = self.entry(file_path)
+        steps = entry.get("steps") if entry.get("parser_version") == self.parser_version else None
+        if steps is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return steps
+
+    def store_steps(self, file_path: str, steps: Dict[str, dict]) -> None:
+        entry = self.entry(file_path)
+        entry["steps"] = steps
+        entry["parser_version"] = self.parser_version
+
+    def save(self, seen_only: bool=True) -> None:
+        """Write the cache, dropping files that were not seen in this run unless seen_only is False."""
+        if self.cache_file is None:
+            return
+
+        entries = self.entries
+        if seen_only:
+            entries = {path: entry for path, entry in entries.items() if path in self.fingerprints}
+        with open(self.cache_file, 'w', encoding='utf-8') as f:
+            json.dump({"files": entries}, f, ensure_ascii=False)
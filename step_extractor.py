@@ -0,0 +1,277 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+import os
+import re
+from collections import Counter
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from discovery import DEFAULT_IGNORE_DIRS, walk_files
+from parse_cache import ParseCache, parser_version
+from step_finder import STEP_DEFINITION_RE, has_step_definitions
+from step_parser import GEMFILE_LOCK, RUBY_SCRIPT, ParserWorker, parse_files, parse_with_workers, write_step_definitions
+import step_tokenizer
+from step_tokenizer import tokenize_step_definitions
+
+# File extensions of each supported language
+LANGUAGES = {
+    "ruby": (".rb",),
+    "javascript": (".js",),
+    "php": (".php",),
+}
+# Files of each language are only parsed if they match its pattern
+STEP_DEFINITION_PATTERNS = {
+    "ruby": STEP_DEFINITION_RE,
+    "javascript": re.compile(rb'\bthis\.(?:Given|When|Then|And)\s*\('),
+    "php": re.compile(rb'@(?:Given|When|Then)\s'),
+}
+
+# A Behat docblock and the declaration of the method it documents
+PHP_STEP_RE = re.compile(r'/\*\*((?:(?!\*/).)*)\*/\s*(?:(?:public|protected|private|static|final)\s+)*(function\s+\w+\s*)\(', re.DOTALL)
+PHP_ANNOTATION_RE = re.compile(r'^\s*\*?\s*@(?:Given|When|Then)\s+(.+?)\s*$', re.MULTILINE)
+PHP_REGEX_RE = re.compile(r'^/(.*)/[a-zA-Z]*$')
+
+# jsparser/parse.js lives next to this module, so it is found whatever the working directory is
+JS_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'jsparser', 'parse.js')
+
+class NodeParserWorker(ParserWorker):
+    """A long-lived `node jsparser/parse.js --worker` process that parses one file per request."""
+
+    def __init__(self, js_script: str=JS_SCRIPT):
+        super().__init__(['node', js_script, '--worker'])
+
+def file_language(file_path: str, languages: Iterable[str]=LANGUAGES) -> Optional[str]:
+    """Return the language of a file from its extension, or None if it isn't one of the languages."""
+    for language in languages:
+        if file_path.endswith(LANGUAGES[language]):
+            return language
+    return None
+
+def skip_php_bracket(source: str, pos: int) -> int:
+    """
+    Find the end of the bracketed PHP code starting at source[pos], skipping strings and comments.
+
+    Returns:
+        int: The position after the matching closing bracket.
+    """
+    closing = {"(": ")", "{": "}", "[": "]"}[source[pos]]
+    stack = [closing]
+    pos += 1
+    while stack:
+        if pos >= len(source):
+            raise ValueError("unbalanced brackets")
+        ch = source[pos]
+        if ch in "'\"":
+            pos += 1
+            while source[pos] != ch:
+                pos += 2 if source[pos] == "\\" else 1
+        elif ch == "#" or source.startswith("//", pos):
+            pos = source.find("\n", pos)
+            if pos == -1:
+                raise ValueError("unbalanced brackets")
+        elif source.startswith("/*", pos):
+            pos = source.index("*/", pos) + 1
+        elif source.startswith("<<<", pos):
+            raise ValueError("heredoc")
+        elif ch in "({[":
+            stack.append({"(": ")", "{": "}", "[": "]"}[ch])
+        elif ch == stack[-1]:
+            stack.pop()
+        pos += 1
+    return pos
+
+def php_step_definitions(source: str, file_path: str) -> Dict[str, dict]:
+    """
+    Extract the Behat step definitions of a PHP context class.
+
+    Each @Given/@When/@Then annotation of a method docblock becomes a step definition, with the
+    method from "function" to its closing brace as its "Code". /regexp/ patterns are stored
+    without their delimiters, like the JavaScript ones.
+
+    Returns:
+        dict: {pattern: {"Code", "File"}}
+    """
+    steps = {}
+    for match in PHP_STEP_RE.finditer(source):
+        patterns = PHP_ANNOTATION_RE.findall(match.group(1))
+        if not patterns:
+            continue
+
+        try:
+            body = skip_php_bracket(source, match.end() - 1)
+            while source[body] not in "{;":
+                body += 1
+            if source[body] == ";":
+                continue
+            end = skip_php_bracket(source, body)
+        except (ValueError, IndexError) as e:
+            print(f"Skipping step definition in {file_path}: {e}")
+            continue
+
+        code = source[match.start(2):end]
+        for pattern in patterns:
+            regex = PHP_REGEX_RE.match(pattern)
+            steps[regex.group(1) if regex else pattern] = {"Code": code, "File": file_path}
+    return steps
+
+def read_php_step_definitions(file_path: str) -> Tuple[Optional[Dict[str, dict]], Optional[str]]:
+    """Read and extract the step definitions of a PHP file, returning the step map or None and the reason."""
+    try:
+        with open(file_path, encoding='utf-8') as f:
+            return php_step_definitions(f.read(), file_path), None
+    except (OSError, UnicodeDecodeError) as e:
+        return None, str(e)
+
+def extract_in_python(language: str, file_path: str) -> Tuple[Optional[Dict[str, dict]], Optional[str]]:
+    """Run the Python backend of a language: the Ruby tokenizer fast path or the PHP extractor."""
+    if language == "ruby":
+        return tokenize_step_definitions(file_path)
+    return read_php_step_definitions(file_path)
+
+def extract_with_python(step_definition_files: List[Tuple[str, str]], workers: int=4) -> List[Tuple[Optional[Dict[str, dict]], Optional[str]]]:
+    """Run the Python backends over (language, path) pairs on a process pool, in the order of the files."""
+    if workers <= 1 or len(step_definition_files) <= 1:
+        return [extract_in_python(language, file_path) for language, file_path in step_definition_files]
+
+    languages = [language for language, _ in step_definition_files]
+    file_paths = [file_path for _, file_path in step_definition_files]
+    chunksize = max(1, len(step_definition_files) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(extract_in_python, languages, file_paths, chunksize=chunksize))
+
+def find_step_definition_files(directory: str, languages: Iterable[str]=LANGUAGES, ignore_dirs: Iterable[str]=DEFAULT_IGNORE_DIRS, parse_cache: Optional[ParseCache]=None) -> List[Tuple[str, str]]:
+    """
+    Find the step definition files of every language in a single traversal.
+
+    Returns:
+        list: (language, path) for each file with step definitions, in traversal order.
+    """
+    parse_cache = parse_cache or ParseCache()
+    step_definition_files = []
+    for file_path in walk_files(directory, ignore_dirs):
+        language = file_language(file_path, languages)
+        if language is None:
+            continue
+        scan = partial(has_step_definitions, pattern=STEP_DEFINITION_PATTERNS[language])
+        if parse_cache.has_step_definitions(file_path, scan):
+            step_definition_files.append((language, file_path))
+
+    counts = Counter(language for language, _ in step_definition_files)
+    print("------------------------------------------------")
+    for language in languages:
+        print(f"Found {counts[language]} {language} step definition files.")
+    print("------------------------------------------------")
+    return step_definition_files
+
+def step_extractor(directory: str, output_dir: str="./data", workers: int=4, use_cache: bool=True, fast_path: bool=True,
+                   languages: Iterable[str]=LANGUAGES, ignore_dirs: Iterable[str]=DEFAULT_IGNORE_DIRS,
+                   ruby_script: str=RUBY_SCRIPT, js_script: str=JS_SCRIPT) -> Dict[str, dict]:
+    """
+    Extract the step definitions of every supported language under a directory into one parsed_stepdefinitions.json.
+
+    Ruby files go through the tokenizer fast path and fall back to parse.rb workers, JavaScript
+    files go to parse.js workers and PHP files to the Behat extractor. The JavaScript workers run
+    in the background while the Python backends run on a process pool and the Ruby fallbacks on
+    their own workers. The "File" of each step is its path relative to the directory, whichever
+    backend parsed it. If the parse.rb or parse.js workers fail (e.g. ruby, node or their parser
+    libraries are missing), the failure is reported and the files of the other backends are still
+    merged and cached. The failed files are left out and retried on the next run.
+
+    Args:
+        directory (str): The project directory.
+        output_dir (str): Where parsed_stepdefinitions.json and its parse cache are written.
+        workers (int): Number of worker processes per backend.
+        use_cache (bool): Reuse the steps of files that haven't changed since the last run.
+        fast_path (bool): Try the Python tokenizer before sending Ruby files to parse.rb.
+        languages (iterable): The languages to extract.
+        ignore_dirs (iterable): Directory names or globs that are not descended into.
+        ruby_script (str): Path to parse.rb.
+        js_script (str): Path to jsparser/parse.js.
+
+    Returns:
+        dict: The merged {pattern: {"Code", "File"}} step map, later files winning like parse.rb.
+    """
+    cache_file = os.path.join(output_dir, 'parsed_stepdefinitions.cache.json') if use_cache else None
+    # the PHP extractor is part of this module
+    version = parser_version([ruby_script, GEMFILE_LOCK, js_script, step_tokenizer.__file__, __file__],
+                             fast_path=fast_path)
+    parse_cache = ParseCache(cache_file, version)
+    step_definition_files = find_step_definition_files(directory, languages, ignore_dirs, parse_cache)
+
+    file_steps = {file_path: parse_cache.steps(file_path) for _, file_path in step_definition_files}
+    changed_files = [(language, file_path) for language, file_path in step_definition_files if file_steps[file_path] is None]
+    backend_files = Counter()
+    failed_files = []
+
+    def store(file_path, steps, backend):
+        parse_cache.store_steps(file_path, steps)
+        file_steps[file_path] = steps
+        backend_files[backend] += 1
+
+    js_files = [file_path for language, file_path in changed_files if language == "javascript"]
+    python_files = [(language, file_path) for language, file_path in changed_files if language == "php" or (language == "ruby" and fast_path)]
+    ruby_files = [file_path for language, file_path in changed_files if language == "ruby" and not fast_path]
+
+    with ThreadPoolExecutor(max_workers=1) as background:
+        js_steps = background.submit(parse_with_workers, js_files, lambda: NodeParserWorker(js_script), workers)
+
+        for (language, file_path), (steps, reason) in zip(python_files, extract_with_python(python_files, workers)):
+            if steps is not None:
+                store(file_path, steps, "Ruby tokenizer" if language == "ruby" else "PHP extractor")
+            elif language == "ruby":
+                print(f"Parsing {file_path} with parse.rb: {reason}")
+                ruby_files.append(file_path)
+            else:
+                print(f"Skipping file {file_path} due to {reason}")
+                file_steps[file_path] = {}
+
+        try:
+            for file_path, steps in zip(ruby_files, parse_files(ruby_files, workers, ruby_script)):
+                store(file_path, steps, "parse.rb")
+        except (RuntimeError, OSError) as e:
+            print(f"Skipping {len(ruby_files)} Ruby files, parse.rb failed: {e}")
+            failed_files.extend(ruby_files)
+
+        try:
+            for file_path, steps in zip(js_files, js_steps.result()):
+                store(file_path, steps, "parse.js")
+        except (RuntimeError, OSError) as e:
+            print(f"Skipping {len(js_files)} JavaScript files, parse.js failed: {e}")
+            failed_files.extend(js_files)
+
+    for file_path in failed_files:
+        # not stored in the parse cache, so they are parsed again on the next run
+        file_steps[file_path] = {}
+
+    result = {}
+    # merge in traversal order so later files win, with one path convention for every backend
+    for _, file_path in step_definition_files:
+        relative_path = os.path.relpath(file_path, directory).replace(os.sep, '/')
+        for pattern, definition in file_steps[file_path].items():
+            result[pattern] = {"Code": definition["Code"], "File": relative_path}
+
+    print(f"Parse Cache Hits: {parse_cache.hits}")
+    print(f"Files Reparsed: {parse_cache.misses}")
+    for backend in ("Ruby tokenizer", "parse.rb", "parse.js", "PHP extractor"):
+        print(f"{backend} Files: {backend_files[backend]}")
+    print(f"Failed Files: {len(failed_files)}")
+    if use_cache:
+        os.makedirs(output_dir, exist_ok=True)
+        parse_cache.save()
+    write_step_definitions(result, output_dir)
+    return result
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Extract Ruby, JavaScript and PHP step definitions into one parsed_stepdefinitions.json.')
+    parser.add_argument('directory', type=str, help='Project directory')
+    parser.add_argument('--output-dir', type=str, default='./data', help='Output directory for parsed files (default: ./data)')
+    parser.add_argument('--workers', type=int, default=4, help='Number of worker processes per backend (default: 4)')
+    parser.add_argument('--languages', type=str, nargs='+', choices=list(LANGUAGES), default=list(LANGUAGES), help='Languages to extract (default: all)')
+    parser.add_argument('--ignore', type=str, nargs='*', default=list(DEFAULT_IGNORE_DIRS), help='Directory names or globs to skip (default: vendor node_modules .git)')
+    parser.add_argument('--no-cache', action='store_true', help='Reparse every file instead of reusing parsed_stepdefinitions.cache.json')
+    parser.add_argument('--no-fast-path', action='store_true', help='Parse every Ruby file with parse.rb instead of trying the Python tokenizer first')
+    parser.add_argument('--ruby-script', type=str, default=RUBY_SCRIPT, help='Path to parse.rb (default: parse.rb next to this script)')
+    parser.add_argument('--js-script', type=str, default=JS_SCRIPT, help='Path to the JavaScript parser (default: jsparser/parse.js next to this script)')
+    args = parser.parse_args()
+
+    step_extractor(args.directory, args.output_dir, args.workers, not args.no_cache, not args.no_fast_path,
+                   args.languages, args.ignore, args.ruby_script, args.js_script)
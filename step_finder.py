@@ -1,42 +1,51 @@
-from typing import List
+from typing import Iterable, List, Optional
 import os
 import re
+import mmap
+from discovery import DEFAULT_IGNORE_DIRS, discover_files
+from parse_cache import ParseCache
 
-def find_step_definition_files(directory: str, file_type: str=".rb") -> List[str]:
+STEP_DEFINITION_PATTERNS = [
+    rb'^(Given|When|Then|And) "',
+    rb'^(Given|When|Then|And)\s*\(',
+    rb'^When\("I (run|type|close|pipe|stop|terminate|wait|send|look) ',
+    rb'^Then\s*\(\/\^\(\d+\) (should|should not|should contain|should not contain|should be|should not be|should match|should not match)',
+    rb'^Given\s*\(\/\^\(\d+\) (aruba|default|wait)',
+    rb'^this\.(Given|When|Then|And)',
+]
+# One alternation over raw bytes, so a file is scanned once and never decoded
+STEP_DEFINITION_RE = re.compile(b'|'.join(b'(?:' + pattern + b')' for pattern in STEP_DEFINITION_PATTERNS),
+                                re.IGNORECASE | re.MULTILINE)
+
+def find_step_definition_files(directory: str, file_type: str=".rb", ignore_dirs: Iterable[str]=DEFAULT_IGNORE_DIRS, quiet: bool=False, parse_cache: Optional[ParseCache]=None) -> List[str]:
     step_definition_files = []
-    for root, dirs, files in os.walk(directory):
-        for file in files:
-            if file.endswith(file_type):
-                file_path = os.path.join(root, file)
-                if has_step_definitions(file_path):
-                    step_definition_files.append(file_path)
+    for file_path in discover_files(directory, file_type, ignore_dirs, quiet=True):
+        if parse_cache is not None:
+            found = parse_cache.has_step_definitions(file_path, has_step_definitions)
+        else:
+            found = has_step_definitions(file_path)
+        if found:
+            step_definition_files.append(file_path)
     
     print("------------------------------------------------")
     print(f"Found {len(step_definition_files)} code files.")
-    print("\nStep Definition Files:")
-    for file_path in step_definition_files:
-        print(file_path)
+    if not quiet:
+        print("\nStep Definition Files:")
+        for file_path in step_definition_files:
+            print(file_path)
     print(f"\nTotal Step Definition Files: {len(step_definition_files)}")
     print("------------------------------------------------")
     return step_definition_files
 
-def has_step_definitions(file_path: str) -> bool:
-    patterns = [
-        r'^(Given|When|Then|And) "',
-        r'^(Given|When|Then|And)\s*\(',
-        r'^When\("I (run|type|close|pipe|stop|terminate|wait|send|look) ',
-        r'^Then\s*\(\/\^\(\d+\) (should|should not|should contain|should not contain|should be|should not be|should match|should not match)',
-        r'^Given\s*\(\/\^\(\d+\) (aruba|default|wait)',
-        r'^this\.(Given|When|Then|And)',
-    ]
-    compiled_patterns = [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+def has_step_definitions(file_path: str, pattern: re.Pattern=STEP_DEFINITION_RE) -> bool:
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            for line in file:
-                if any(pattern.search(line) for pattern in compiled_patterns):
-                    return True
-    except UnicodeDecodeError:
-        print(f"Skipping file {file_path} due to UnicodeDecodeError")
+        with open(file_path, 'rb') as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                return False
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as contents:
+                return pattern.search(contents) is not None
+    except OSError as e:
+        print(f"Skipping file {file_path} due to {e}")
     
     return False
 
@@ -46,6 +55,8 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Find and print Ruby step definition files.')
     parser.add_argument('directory', type=str, help='Directory to search for step definition files')
     parser.add_argument('--file-type', type=str, default='.rb', help='File type to search for (default: .rb)')
+    parser.add_argument('--ignore', type=str, nargs='*', default=list(DEFAULT_IGNORE_DIRS), help='Directory names or globs to skip (default: vendor node_modules .git)')
+    parser.add_argument('--quiet', action='store_true', help='Only print the number of step definition files found')
     args = parser.parse_args()
 
-    step_definition_files = find_step_definition_files(args.directory, args.file_type)
\ No newline at end of file
+    step_definition_files = find_step_definition_files(args.directory, args.file_type, args.ignore, args.quiet)
\ No newline at end of file
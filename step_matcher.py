@@ -0,0 +1,536 @@
+import os
+import re
+import json
+import hashlib
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+# Characters that end a run of literal text in a regex pattern
+REGEX_METACHARS = set('.^$*+?{}[]|()')
+QUANTIFIER_RE = re.compile(r'\{\d*(,\d*)?\}')
+# Octal escapes: \0 with up to two more octal digits, or any three octal digits (otherwise it's a backreference)
+OCTAL_ESCAPE_RE = re.compile(r'0[0-7]{0,2}|[0-7]{3}')
+# Number of hex digits of each hex escape
+HEX_ESCAPE_LENGTHS = {'x': 2, 'u': 4, 'U': 8}
+
+def _next_atom(pattern: str, i: int) -> Tuple[Optional[str], int]:
+    """
+    Read a single atom from the pattern starting at index i.
+
+    Args:
+        pattern (str): The regex pattern.
+        i (int): The index to start reading from.
+
+    Returns:
+        tuple: The literal character (or None if the atom is not a plain literal) and the index after the atom.
+    """
+    char = pattern[i]
+    if char == '\\':
+        if i + 1 >= len(pattern):
+            return None, i + 1
+        escaped = pattern[i + 1]
+        # escapes that spell out a single character are consumed whole and read as that character
+        if escaped in HEX_ESCAPE_LENGTHS:
+            end = i + 2 + HEX_ESCAPE_LENGTHS[escaped]
+            return chr(int(pattern[i + 2:end], 16)), end
+        if escaped == 'N' and pattern.startswith('{', i + 2):
+            end = pattern.index('}', i) + 1
+            return unicodedata.lookup(pattern[i + 3:end - 1]), end
+        if escaped.isdigit():
+            octal = OCTAL_ESCAPE_RE.match(pattern, i + 1)
+            if octal:
+                return chr(int(octal.group(), 8)), octal.end()
+            # \1 to \99 are backreferences
+            end = i + 2
+            if end < len(pattern) and pattern[end].isdigit():
+                end += 1
+            return None, end
+        # \d, \w, \b etc. are classes or anchors, not literals
+        if escaped.isalnum():
+            return None, i + 2
+        return escaped, i + 2
+    if char in REGEX_METACHARS:
+        return None, i
+    return char, i + 1
+
+def _quantifier_end(pattern: str, i: int) -> int:
+    """Return the index after a quantifier starting at i, or i if there is no quantifier."""
+    if i >= len(pattern):
+        return i
+    if pattern[i] in '*+?':
+        end = i + 1
+    elif pattern[i] == '{':
+        match = QUANTIFIER_RE.match(pattern, i)
+        if match is None or not any(c.isdigit() for c in match.group()):
+            return i
+        end = match.end()
+    else:
+        return i
+    # lazy / possessive modifiers
+    if end < len(pattern) and pattern[end] in '?+':
+        end += 1
+    return end
+
+def _skip_group_or_class(pattern: str, i: int) -> int:
+    """
+    Skip over a group or character class starting at index i.
+
+    Args:
+        pattern (str): The regex pattern.
+        i (int): The index of the opening '(' or '['.
+
+    Returns:
+        int: The index after the closing ')' or ']'.
+    """
+    depth = 0
+    in_class = False
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '\\':
+            i += 2
+            continue
+        if in_class:
+            if char == ']':
+                in_class = False
+                if depth == 0:
+                    return i + 1
+        elif char == '[':
+            in_class = True
+            # a leading ']' or '^]' is part of the class
+            if pattern[i + 1:i + 2] == '^':
+                i += 1
+            if pattern[i + 1:i + 2] == ']':
+                i += 1
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return i
+
+def has_top_level_alternation(pattern: str) -> bool:
+    """Check whether the pattern has a '|' outside of any group or character class."""
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '\\':
+            i += 2
+        elif char in '([':
+            i = _skip_group_or_class(pattern, i)
+        elif char == '|':
+            return True
+        else:
+            i += 1
+    return False
+
+def literal_prefix(pattern: str) -> str:
+    """
+    Find the literal text every string matched by the pattern (with re.match) must start with.
+
+    Args:
+        pattern (str): The regex pattern.
+
+    Returns:
+        str: The literal prefix, or an empty string if the pattern has none.
+    """
+    if has_top_level_alternation(pattern):
+        return ""
+
+    i = 1 if pattern.startswith('^') else 0
+    prefix = []
+    while i < len(pattern):
+        literal, end = _next_atom(pattern, i)
+        if literal is None:
+            break
+        if _quantifier_end(pattern, end) != end:
+            # the last literal is optional or repeated, so it is not part of the prefix
+            break
+        prefix.append(literal)
+        i = end
+    return "".join(prefix)
+
+def required_literals(pattern: str, min_length: int=2) -> Tuple[str, ...]:
+    """
+    Find the runs of literal text outside of groups that every match of the pattern must contain.
+
+    Args:
+        pattern (str): The regex pattern.
+        min_length (int): The minimum length of a literal run to keep.
+
+    Returns:
+        tuple: The required literal strings.
+    """
+    if has_top_level_alternation(pattern):
+        return ()
+
+    tokens = []
+    run = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char in '([':
+            end = _skip_group_or_class(pattern, i)
+            literal = None
+        else:
+            literal, end = _next_atom(pattern, i)
+            if end == i:
+                # anchors, quantifiers and stray metacharacters
+                end = i + 1
+
+        quantifier_end = _quantifier_end(pattern, end)
+        if literal is None or quantifier_end != end:
+            if len(run) >= min_length:
+                tokens.append("".join(run))
+            run = []
+        else:
+            run.append(literal)
+        i = quantifier_end
+
+    if len(run) >= min_length:
+        tokens.append("".join(run))
+    return tuple(tokens)
+
+def pattern_filter(pattern: str, compiled: re.Pattern) -> Tuple[str, Tuple[str, ...]]:
+    """
+    Work out the cheap checks a step has to pass before the pattern's regex is worth running.
+
+    Args:
+        pattern (str): The regex pattern.
+        compiled (re.Pattern): The compiled pattern, whose inline flags decide whether literals can be used.
+
+    Returns:
+        tuple: The literal prefix ("" if there is none) and the other required literals of the pattern.
+    """
+    if compiled.flags & (re.IGNORECASE | re.VERBOSE):
+        # inline flags change how literals match, so always run the regex
+        return "", ()
+
+    prefix = literal_prefix(pattern)
+    tokens = required_literals(pattern)
+    if prefix:
+        # the prefix itself is already checked by the bucket lookup
+        tokens = tuple(token for token in tokens if not prefix.startswith(token))
+    return prefix, tokens
+
+class CompiledPatterns:
+    """The compiled regexes of a list of patterns, each compiled the first time it is needed."""
+
+    def __init__(self, keys: List[str]):
+        self.keys = keys
+        self.compiled = [None] * len(keys)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __getitem__(self, index: int) -> re.Pattern:
+        compiled = self.compiled[index]
+        if compiled is None:
+            compiled = self.compiled[index] = re.compile(self.keys[index])
+        return compiled
+
+class StepMatcher:
+    """
+    Index of step definition patterns built once from a parsed definitions dictionary.
+
+    Patterns are bucketed by their literal prefix, so a step only runs the regexes of the
+    definitions that could possibly match it. Patterns without a literal prefix are checked
+    against their required literal text before the regex runs. Results are the same as
+    scanning the definitions in dictionary order with re.match.
+    """
+
+    def __init__(self, step_patterns: Dict[str, dict], filters: Optional[List[Tuple[str, Tuple[str, ...]]]]=None):
+        """
+        Args:
+            step_patterns (dict): A dictionary where keys are regex patterns and values are dictionaries
+                                  containing step definitions, including the "Code" and "File".
+            filters (list): The pattern_filter of each pattern, e.g. loaded from a DefinitionRegistry cache.
+                            If given, the regexes are only compiled when a step reaches them. Otherwise every
+                            pattern is compiled and analysed up front.
+        """
+        self.keys = list(step_patterns)
+        self.patterns = CompiledPatterns(self.keys)
+        self.definitions = list(step_patterns.values())
+        if filters is None:
+            filters = [pattern_filter(pattern, self.patterns[index]) for index, pattern in enumerate(self.keys)]
+        self.filters = filters
+        self.prefix_index = {}
+        self.unprefixed = []
+
+        for index, (prefix, tokens) in enumerate(filters):
+            if prefix:
+                self.prefix_index.setdefault(prefix, []).append((index, tokens))
+            else:
+                self.unprefixed.append((index, tokens))
+
+        self.prefix_lengths = sorted({len(prefix) for prefix in self.prefix_index})
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def candidates(self, step_name: str) -> List[int]:
+        """
+        Find the indices of the patterns that could match the step, in definition order.
+
+        Args:
+            step_name (str): The name of the step to search for.
+
+        Returns:
+            list: Sorted indices into the compiled patterns.
+        """
+        candidates = []
+        for length in self.prefix_lengths:
+            if length > len(step_name):
+                break
+            bucket = self.prefix_index.get(step_name[:length])
+            if bucket:
+                candidates.extend(index for index, tokens in bucket
+                                  if all(token in step_name for token in tokens))
+
+        for index, tokens in self.unprefixed:
+            if all(token in step_name for token in tokens):
+                candidates.append(index)
+
+        candidates.sort()
+        return candidates
+
+    def template_candidates(self, fixed_prefix: str) -> List[Tuple[int, str, Tuple[str, ...]]]:
+        """
+        Find the patterns that could match any step starting with fixed_prefix, whatever text follows it.
+
+        Args:
+            fixed_prefix (str): The text every step of interest starts with, e.g. the text before the
+                                first placeholder of a Scenario Outline step.
+
+        Returns:
+            list: Sorted (index, literal prefix, required literals) of the candidate patterns. The
+                  prefix and literals still have to be checked against each step.
+        """
+        candidates = [(index, prefix, tokens) for prefix, bucket in self.prefix_index.items()
+                      if prefix.startswith(fixed_prefix) or fixed_prefix.startswith(prefix)
+                      for index, tokens in bucket]
+        candidates.extend((index, "", tokens) for index, tokens in self.unprefixed)
+        candidates.sort()
+        return candidates
+
+    def search_index(self, step_name: str) -> Optional[int]:
+        """
+        Given a feature step, find the index of the first pattern that matches it.
+
+        Args:
+            step_name (str): The name of the step to search for.
+
+        Returns:
+            int or None: The index of the matching pattern, otherwise None.
+        """
+        for index in self.candidates(step_name):
+            if self.patterns[index].match(step_name):
+                return index
+        return None
+
+    def resolve_index(self, step_name: str) -> Optional[int]:
+        """
+        Find the matching pattern index, retrying with a trailing ':' for steps followed by a table or doc string.
+
+        Args:
+            step_name (str): The name of the step to search for.
+
+        Returns:
+            int or None: The index of the matching pattern, otherwise None.
+        """
+        index = self.search_index(step_name)
+        if index is None:
+            index = self.search_index(step_name + ":")
+        return index
+
+    def search(self, step_name: str) -> Optional[dict]:
+        """
+        Given a feature step, search the indexed definitions for the glue code.
+
+        Args:
+            step_name (str): The name of the step to search for.
+
+        Returns:
+            dict or None: The first definition whose pattern matches the step_name, otherwise None.
+        """
+        index = self.search_index(step_name)
+        return None if index is None else self.definitions[index]
+
+    def resolve(self, step_name: str) -> Optional[dict]:
+        """
+        Search for the step, retrying with a trailing ':' for steps followed by a table or doc string.
+
+        Args:
+            step_name (str): The name of the step to search for.
+
+        Returns:
+            dict or None: The matching definition, otherwise None.
+        """
+        index = self.resolve_index(step_name)
+        return None if index is None else self.definitions[index]
+
+class TemplateStep:
+    """
+    A Scenario Outline step whose candidate patterns are found once, then checked for each Examples row.
+
+    Every row's step starts with the template text before the first placeholder, so only the
+    patterns whose literal prefix agrees with that text are kept. Each row then only runs the
+    cheap prefix and literal checks and the regexes of those candidates. Results are the same as
+    StepMatcher.resolve_index on the substituted step.
+    """
+
+    def __init__(self, matcher: StepMatcher, template: str):
+        """
+        Args:
+            matcher (StepMatcher): The matcher of the step definitions.
+            template (str): The step text with its <placeholders>.
+        """
+        self.matcher = matcher
+        self.template = template
+        self.candidates = matcher.template_candidates(template.split("<", 1)[0])
+
+    def search_index(self, step_name: str) -> Optional[int]:
+        """Find the index of the first pattern that matches a substituted step, otherwise None."""
+        patterns = self.matcher.patterns
+        for index, prefix, tokens in self.candidates:
+            if (step_name.startswith(prefix) and all(token in step_name for token in tokens)
+                    and patterns[index].match(step_name)):
+                return index
+        return None
+
+    def resolve_index(self, step_name: str) -> Optional[int]:
+        """Find the matching pattern index, retrying with a trailing ':' like StepMatcher.resolve_index."""
+        index = self.search_index(step_name)
+        if index is None:
+            index = self.search_index(step_name + ":")
+        return index
+
+def definitions_hash(step_patterns: Dict[str, dict]) -> str:
+    """
+    Hash the step definitions so cached matches can be invalidated when they change.
+
+    The hash depends on the order of the definitions, since the first matching pattern wins.
+    """
+    return hashlib.sha256(json.dumps(step_patterns).encode()).hexdigest()
+
+class ResolutionCache:
+    """
+    Bounded LRU cache of step name -> matched definition in front of a StepMatcher.
+
+    The cache can be saved to and loaded from a JSON file. The file records a hash of the
+    definitions it was built from and is ignored if the definitions have changed since.
+    """
+
+    def __init__(self, matcher: StepMatcher, step_patterns: Dict[str, dict], max_size: int=4096, cache_file: Optional[str]=None):
+        """
+        Args:
+            matcher (StepMatcher): The matcher used to resolve steps that are not cached.
+            step_patterns (dict): The definitions the matcher was built from, used to key the cache file.
+            max_size (int): The maximum number of step names to keep. 0 disables the cache.
+            cache_file (str): Optional path of a JSON file to persist the cache between runs.
+        """
+        self.matcher = matcher
+        self.max_size = max_size
+        self.cache_file = cache_file
+        self.definitions_hash = definitions_hash(step_patterns)
+        self.entries = OrderedDict()
+        # step names resolved by the matcher since new_entries was last drained, only recorded when
+        # record_new_entries is set (in worker processes, which send them back to the parent)
+        self.record_new_entries = False
+        self.new_entries = {}
+        self.hits = 0
+        self.misses = 0
+
+        if cache_file is not None:
+            self.load(cache_file)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def resolve(self, step_name: str, template: Optional[TemplateStep]=None) -> Optional[dict]:
+        """
+        Resolve the step through the cache, falling back to the matcher on a miss.
+
+        Args:
+            step_name (str): The name of the step to search for.
+            template (TemplateStep): The outline step the step was substituted from, if any. Its
+                                     candidates are searched on a miss instead of the whole matcher.
+
+        Returns:
+            dict or None: The matching definition, otherwise None.
+        """
+        if step_name in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(step_name)
+            index = self.entries[step_name]
+        else:
+            self.misses += 1
+            index = (template or self.matcher).resolve_index(step_name)
+            self.store(step_name, index)
+
+        return None if index is None else self.matcher.definitions[index]
+
+    def store(self, step_name: str, index: Optional[int]) -> None:
+        """
+        Add a resolved step to the cache, evicting the least recently used entry if it is full.
+
+        Args:
+            step_name (str): The name of the step.
+            index (int or None): The index of the matching pattern in the matcher, or None if unmatched.
+        """
+        if self.max_size <= 0:
+            return
+
+        if self.record_new_entries:
+            self.new_entries[step_name] = index
+        self.entries[step_name] = index
+        self.entries.move_to_end(step_name)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def load(self, cache_file: str) -> None:
+        """
+        Load cached matches from a file written by save, if it was built from the same definitions.
+
+        Args:
+            cache_file (str): The path of the cache file.
+        """
+        if self.max_size <= 0 or not os.path.exists(cache_file):
+            return
+
+        try:
+            with open(cache_file) as f:
+                cached = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable step cache {cache_file}: {e}")
+            return
+
+        if cached.get("definitions_hash") != self.definitions_hash:
+            print(f"Step definitions changed, ignoring step cache {cache_file}")
+            return
+
+        key_to_index = {key: index for index, key in enumerate(self.matcher.keys)}
+        for step_name, key in cached.get("steps", {}).items():
+            self.entries[step_name] = None if key is None else key_to_index[key]
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def save(self, cache_file: Optional[str]=None) -> None:
+        """
+        Save the cached matches, keyed by the definitions hash.
+
+        Args:
+            cache_file (str): The path of the cache file. Defaults to the file the cache was created with.
+        """
+        cache_file = cache_file or self.cache_file
+        if cache_file is None:
+            return
+
+        steps = {
+            step_name: None if index is None else self.matcher.keys[index]
+            for step_name, index in self.entries.items()
+        }
+        with open(cache_file, 'w') as f:
+            json.dump({"definitions_hash": self.definitions_hash, "steps": steps}, f)
@@ -1,13 +1,130 @@
-from typing import List
+from typing import Callable, Dict, List
+import os
+import queue
 import subprocess
 import json
+from concurrent.futures import ThreadPoolExecutor
 from step_finder import find_step_definition_files
+from parse_cache import ParseCache, parser_version
+import step_tokenizer
+from step_tokenizer import tokenize_step_definitions
 
-def step_parser(directory: str, file_type: str=".rb", output_dir="./data") -> None:
-    step_definition_files = find_step_definition_files(directory, file_type)
-    ruby_script = './parse.rb'
+# parse.rb lives next to this module, so it is found whatever the working directory is
+RUBY_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'parse.rb')
+# The locked parser/unparser gems decide parse.rb's output along with the script itself
+GEMFILE_LOCK = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Gemfile.lock')
 
-    subprocess.run(['ruby', ruby_script] + step_definition_files + [output_dir])
+class ParserWorker:
+    """
+    A long-lived parser process that reads one JSON request per line, {"file": path}, and
+    answers each with one JSON line, {"file": path, "steps": {...}}.
+    """
+
+    def __init__(self, command: List[str]):
+        self.command = command
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        text=True, encoding='utf-8', bufsize=1)
+
+    def parse(self, file_path: str) -> Dict[str, dict]:
+        """Send a file to the worker and return its {regex: {"Code", "File"}} step map."""
+        self.process.stdin.write(json.dumps({"file": file_path}) + "\n")
+        self.process.stdin.flush()
+        response = self.process.stdout.readline()
+        if not response:
+            raise RuntimeError(f"Parser worker {' '.join(self.command)} exited while parsing {file_path}")
+        return json.loads(response)["steps"]
+
+    def close(self) -> None:
+        self.process.stdin.close()
+        self.process.wait()
+
+class RubyParserWorker(ParserWorker):
+    """A long-lived `ruby parse.rb --worker` process that parses one file per request."""
+
+    def __init__(self, ruby_script: str=RUBY_SCRIPT):
+        super().__init__(['ruby', ruby_script, '--worker'])
+
+def parse_with_workers(step_definition_files: List[str], create_worker: Callable[[], ParserWorker], workers: int=4) -> List[Dict[str, dict]]:
+    """Parse the files on a pool of parser workers, returning the step maps in the order of the files."""
+    if not step_definition_files:
+        return []
+
+    idle_workers = queue.Queue()
+    parser_workers = []
+
+    def parse_file(file_path):
+        parser_worker = idle_workers.get()
+        try:
+            return parser_worker.parse(file_path)
+        finally:
+            idle_workers.put(parser_worker)
+
+    try:
+        # workers that started are closed even if a later one can't be
+        for _ in range(min(workers, len(step_definition_files))):
+            parser_workers.append(create_worker())
+            idle_workers.put(parser_workers[-1])
+        with ThreadPoolExecutor(max_workers=len(parser_workers)) as executor:
+            return list(executor.map(parse_file, step_definition_files))
+    finally:
+        for parser_worker in parser_workers:
+            parser_worker.close()
+
+def parse_files(step_definition_files: List[str], workers: int=4, ruby_script: str=RUBY_SCRIPT) -> List[Dict[str, dict]]:
+    """Parse the files on a pool of Ruby workers, returning the step maps in the order of the files."""
+    return parse_with_workers(step_definition_files, lambda: RubyParserWorker(ruby_script), workers)
+
+def write_step_definitions(result: Dict[str, dict], output_dir: str) -> None:
+    if not result:
+        print("Steps were not parsed properly / no step definitions files were passed")
+        return
+
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, 'parsed_stepdefinitions.json')
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    print(f"Parsed step definitions have been written to {output_path}")
+
+def step_parser(directory: str, file_type: str=".rb", output_dir="./data", workers: int=4, use_cache: bool=True, fast_path: bool=True) -> None:
+    cache_file = os.path.join(output_dir, 'parsed_stepdefinitions.cache.json') if use_cache else None
+    ruby_script = RUBY_SCRIPT
+    version = parser_version([ruby_script, GEMFILE_LOCK, step_tokenizer.__file__], fast_path=fast_path)
+    parse_cache = ParseCache(cache_file, version)
+    step_definition_files = find_step_definition_files(directory, file_type, parse_cache=parse_cache)
+
+    # only files that changed since the last run are parsed again
+    file_steps = {file_path: parse_cache.steps(file_path) for file_path in step_definition_files}
+    changed_files = [file_path for file_path, steps in file_steps.items() if steps is None]
+
+    # the tokenizer handles the common step definition shapes, the rest are sent to Ruby
+    ruby_files = []
+    for file_path in changed_files:
+        steps, reason = tokenize_step_definitions(file_path) if fast_path else (None, None)
+        if steps is None:
+            if reason is not None:
+                print(f"Parsing {file_path} with parse.rb: {reason}")
+            ruby_files.append(file_path)
+        else:
+            parse_cache.store_steps(file_path, steps)
+            file_steps[file_path] = steps
+
+    for file_path, steps in zip(ruby_files, parse_files(ruby_files, workers, ruby_script)):
+        parse_cache.store_steps(file_path, steps)
+        file_steps[file_path] = steps
+
+    result = {}
+    # merge in file order so later files win, like parse.rb's one-shot mode
+    for file_path in step_definition_files:
+        result.update(file_steps[file_path])
+
+    print(f"Parse Cache Hits: {parse_cache.hits}")
+    print(f"Files Reparsed: {parse_cache.misses}")
+    print(f"Fast Path Files: {len(changed_files) - len(ruby_files)}")
+    print(f"Ruby Parser Files: {len(ruby_files)}")
+    if use_cache:
+        os.makedirs(output_dir, exist_ok=True)
+        parse_cache.save()
+    write_step_definitions(result, output_dir)
 
 if __name__ == "__main__":
     import argparse
@@ -15,8 +132,9 @@ if __name__ == "__main__":
     parser.add_argument('directory', type=str, help='Directory containing Ruby files')
     parser.add_argument('--file-type', type=str, default='.rb', help='File type of Ruby files (default: .rb)')
     parser.add_argument('--output-dir', type=str, default='./data', help='Output directory for parsed files (default: ./data)')
+    parser.add_argument('--workers', type=int, default=4, help='Number of Ruby parser worker processes (default: 4)')
+    parser.add_argument('--no-cache', action='store_true', help='Reparse every file instead of reusing parsed_stepdefinitions.cache.json')
+    parser.add_argument('--no-fast-path', action='store_true', help='Parse every file with parse.rb instead of trying the Python tokenizer first')
     args = parser.parse_args()
 
-    step_parser(args.directory, args.file_type, args.output_dir)
-
-
+    step_parser(args.directory, args.file_type, args.output_dir, args.workers, not args.no_cache, not args.no_fast_path)
\ No newline at end of file
@@ -0,0 +1,730 @@
+from typing import Dict, List, Optional, Tuple
+import re
+from collections import namedtuple
+
+STEP_KEYWORDS = ("Given", "When", "Then", "And")
+KEYWORDS = {
+    "alias", "and", "begin", "break", "case", "class", "def", "defined?", "do", "else", "elsif", "end",
+    "ensure", "false", "for", "if", "in", "module", "next", "nil", "not", "or", "redo", "rescue", "retry",
+    "return", "self", "super", "then", "true", "undef", "unless", "until", "when", "while", "yield",
+    "__FILE__", "__LINE__", "__END__", "__method__", "BEGIN", "END",
+}
+LITERAL_KEYWORDS = ("nil", "true", "false", "self")
+JUMP_KEYWORDS = ("next", "break", "return")
+
+# Binary operators by precedence level. A chain of operators is only accepted within a single
+# level, where unparser prints it back without adding parentheses.
+BINARY_OPERATORS = {
+    "||": "or", "&&": "and",
+    "==": "equality", "!=": "equality", "=~": "equality", "!~": "equality",
+    "<": "comparison", ">": "comparison", "<=": "comparison", ">=": "comparison",
+    "<<": "shift", "+": "additive", "-": "additive", "*": "multiplicative", "/": "multiplicative",
+}
+NON_ASSOCIATIVE = ("equality", "comparison")
+ASSIGNMENT_OPERATORS = ("=", "+=", "-=", "*=", "||=", "&&=")
+
+OPERATORS = sorted([
+    "**", "::", "&.", "...", "..", "<=>", "===", "==", "!=", "=~", "!~", ">=", "<=", "&&=", "||=", "&&",
+    "||", "<<", ">>", "+=", "-=", "*=", "/=", "=>", "->", "=", "<", ">", "+", "-", "*", "/", "%", "!",
+    "&", "|", "^", "~", "?", ".", ",", "(", ")", "[", "]", "{", "}", ";", ":",
+], key=len, reverse=True)
+NAME_RE = re.compile(r"(?:@@?|\$)?[A-Za-z_][A-Za-z0-9_]*(?:[?!](?![=~]))?")
+NUMBER_RE = re.compile(r"\d+(?:\.\d+)?(?![\w])")
+SYMBOL_RE = re.compile(r":[A-Za-z_][A-Za-z0-9_]*[?!]?")
+REGEX_FLAGS_RE = re.compile(r"[imx]*")
+PERCENT_DELIMITERS = {"!": "!", "{": "}", "(": ")", "[": "]", "|": "|"}
+STRING_ESCAPES = 'nt"\\'
+
+Token = namedtuple("Token", ["kind", "text", "spaced", "line"])
+
+class UnsupportedSyntax(ValueError):
+    """Raised for code the tokenizer can't reproduce exactly as parse.rb would, so the file goes to Ruby."""
+
+    def __init__(self, message: str, line: int=None):
+        super().__init__(message if line is None else f"line {line}: {message}")
+
+def is_printable(text: str) -> bool:
+    return all(" " <= ch <= "~" for ch in text)
+
+class Lexer:
+    """
+    Splits Ruby source into tokens, rewriting string literals in the double-quoted form unparser prints.
+
+    Only a conservative subset of Ruby is recognised: heredocs, percent literals other than %r, multi-line
+    strings, non-ASCII string contents and the like raise UnsupportedSyntax.
+    """
+
+    def __init__(self, source: str, pos: int=0, line: int=1):
+        self.source = source
+        self.pos = pos
+        self.line = line
+        self.tokens = []
+
+    def error(self, message: str):
+        return UnsupportedSyntax(message, self.line)
+
+    def previous_is_value(self) -> bool:
+        """Check whether the last token ends an operand, making a following / a division."""
+        if not self.tokens:
+            return False
+        previous = self.tokens[-1]
+        if previous.kind == "op":
+            return previous.text in (")", "]", "}")
+        if previous.kind == "name":
+            # Given /^...$/ do: a spaced / not followed by a space starts a command argument
+            if self.source[self.pos - 1] in " \t" and self.source[self.pos + 1:self.pos + 2] not in (" ", "="):
+                return False
+            return previous.text not in KEYWORDS or previous.text in LITERAL_KEYWORDS + ("end",)
+        return previous.kind not in ("nl", "label")
+
+    def tokenize(self, interpolation: bool=False) -> List[Token]:
+        """
+        Tokenize until the end of the source, or until the } closing an interpolation.
+
+        Returns:
+            list: The tokens, with newlines as "nl" tokens and comments dropped.
+        """
+        source = self.source
+        depth = 0
+        spaced = False
+        while self.pos < len(source):
+            ch = source[self.pos]
+            at_line_start = self.pos == 0 or source[self.pos - 1] == "\n"
+
+            if ch in " \t":
+                self.pos += 1
+                spaced = True
+                continue
+            if ch == "\n":
+                if interpolation:
+                    raise self.error("multi-line interpolation")
+                self.tokens.append(Token("nl", "\n", spaced, self.line))
+                self.pos += 1
+                self.line += 1
+                spaced = False
+                continue
+            if ch == "#":
+                if interpolation:
+                    raise self.error("comment in interpolation")
+                while self.pos < len(source) and source[self.pos] != "\n":
+                    self.pos += 1
+                continue
+            if at_line_start and source.startswith(("=begin", "__END__"), self.pos):
+                raise self.error("block comment or __END__")
+
+            if ch.isalpha() or ch in "_@$":
+                match = NAME_RE.match(source, self.pos)
+                if match is None:
+                    raise self.error(f"unexpected {ch!r}")
+                text = match.group()
+                end = match.end()
+                if source.startswith(":", end) and not source.startswith("::", end) and text[-1] not in "?!":
+                    self.tokens.append(Token("label", text + ":", spaced, self.line))
+                    end += 1
+                else:
+                    self.tokens.append(Token("name", text, spaced, self.line))
+                self.pos = end
+            elif ch.isdigit():
+                match = NUMBER_RE.match(source, self.pos)
+                if match is None:
+                    raise self.error("unsupported number literal")
+                self.tokens.append(Token("number", match.group(), spaced, self.line))
+                self.pos = match.end()
+            elif ch in "\"`":
+                self.tokens.append(Token("string", self.double_quoted(ch), spaced, self.line))
+            elif ch == "'":
+                self.tokens.append(Token("string", self.single_quoted(), spaced, self.line))
+            elif ch == ":" and SYMBOL_RE.match(source, self.pos) and not (self.tokens and not spaced and self.tokens[-1].kind == "name"):
+                match = SYMBOL_RE.match(source, self.pos)
+                self.tokens.append(Token("symbol", match.group(), spaced, self.line))
+                self.pos = match.end()
+            elif ch == "/" and not self.previous_is_value():
+                self.tokens.append(Token("regex", self.regex("/", "/"), spaced, self.line))
+            elif source.startswith("%r", self.pos) and source[self.pos + 2:self.pos + 3] in PERCENT_DELIMITERS:
+                opening = source[self.pos + 2]
+                self.pos += 2
+                self.tokens.append(Token("percent_regex", self.regex(opening, PERCENT_DELIMITERS[opening]), spaced, self.line))
+            elif source.startswith(("%(", "%Q("), self.pos):
+                self.pos = source.index("(", self.pos)
+                self.tokens.append(Token("string", self.double_quoted("(", ")"), spaced, self.line))
+            elif source.startswith(("%w(", "%w["), self.pos):
+                self.tokens.append(Token("words", self.words(), spaced, self.line))
+            elif ch == "%" and not (spaced and source[self.pos + 1:self.pos + 2] == " "):
+                raise self.error("percent literal")
+            elif source.startswith("<<", self.pos) and source[self.pos + 2:self.pos + 3] not in (" ", "="):
+                raise self.error("heredoc")
+            else:
+                operator = next((op for op in OPERATORS if source.startswith(op, self.pos)), None)
+                if operator is None:
+                    raise self.error(f"unexpected {ch!r}")
+                if interpolation and operator == "}" and depth == 0:
+                    self.pos += 1
+                    return self.tokens
+                if operator == "{":
+                    depth += 1
+                elif operator == "}":
+                    depth -= 1
+                self.tokens.append(Token("op", operator, spaced, self.line))
+                self.pos += len(operator)
+            spaced = False
+
+        if interpolation:
+            raise self.error("unterminated interpolation")
+        return self.tokens
+
+    def double_quoted(self, opening: str, closing: str=None) -> str:
+        """
+        Read a "...", `...` or %(...) literal, printing any interpolated code in canonical form.
+
+        A %(...) literal is printed as a "..." string, escaping its double quotes.
+        """
+        source = self.source
+        closing = closing or opening
+        quote = "`" if opening == "`" else '"'
+        parts = [quote]
+        nesting = 0
+        self.pos += 1
+        while True:
+            if self.pos >= len(source) or source[self.pos] == "\n":
+                raise self.error("multi-line string")
+            ch = source[self.pos]
+            if ch == closing and nesting == 0:
+                self.pos += 1
+                # unparser prints interpolated strings with newlines as heredocs
+                if "\\n" in parts and any(part.startswith("#{") for part in parts):
+                    raise self.error("interpolated string with a newline")
+                parts.append(quote)
+                return "".join(parts)
+            if ch == "\\":
+                escaped = source[self.pos + 1:self.pos + 2]
+                if opening != '"' or escaped not in STRING_ESCAPES:
+                    raise self.error(f"string escape \\{escaped}")
+                parts.append(ch + escaped)
+                self.pos += 2
+            elif ch == "#" and source[self.pos + 1:self.pos + 2] in ("{", "@", "$"):
+                if source[self.pos + 1] != "{":
+                    raise self.error("bare interpolation")
+                inner = Lexer(source, self.pos + 2, self.line)
+                tokens = inner.tokenize(interpolation=True)
+                parts.append("#{" + canonical_expression(tokens, self.line) + "}")
+                self.pos = inner.pos
+            elif not is_printable(ch) or (quote == "`" and ch == '"'):
+                raise self.error("unsupported character in string")
+            elif ch == '"' and opening == "(":
+                parts.append('\\"')
+                self.pos += 1
+            else:
+                if opening != closing:
+                    nesting += {opening: 1, closing: -1}.get(ch, 0)
+                parts.append(ch)
+                self.pos += 1
+
+    def words(self) -> str:
+        """Read a %w(...) literal, which unparser prints as an array of strings."""
+        closing = PERCENT_DELIMITERS[self.source[self.pos + 2]]
+        end = self.source.find(closing, self.pos + 3)
+        if end == -1:
+            raise self.error("unterminated word list")
+        words = self.source[self.pos + 3:end].split()
+        if not words or any(not is_printable(word) or any(ch in word for ch in '\\"#([') for word in words):
+            raise self.error("word list needs escaping")
+        self.pos = end + 1
+        return "[" + ", ".join(f'"{word}"' for word in words) + "]"
+
+    def single_quoted(self) -> str:
+        """Read a '...' literal with no escapes, quotes or #, which unparser prints double-quoted."""
+        end = self.source.find("'", self.pos + 1)
+        if end == -1:
+            raise self.error("unterminated string")
+        value = self.source[self.pos + 1:end]
+        if not is_printable(value) or any(ch in value for ch in '\\"#'):
+            raise self.error("single-quoted string needs escaping")
+        self.pos = end + 1
+        return f'"{value}"'
+
+    def regex(self, opening: str, closing: str) -> str:
+        """Read a regexp literal and return its source between the delimiters, as parse.rb stores it."""
+        source = self.source
+        start = self.pos + 1
+        end = start
+        nesting = 0
+        while True:
+            if end >= len(source) or source[end] == "\n":
+                raise self.error("multi-line regexp")
+            ch = source[end]
+            if ch == "\\":
+                if source[end + 1:end + 2] in (opening, closing, "\n"):
+                    raise self.error("escaped regexp delimiter")
+                end += 2
+                continue
+            if ch == closing:
+                if nesting == 0:
+                    break
+                nesting -= 1
+            elif ch == opening:
+                nesting += 1
+            elif source.startswith("#{", end):
+                raise self.error("interpolation in regexp")
+            end += 1
+
+        flags = REGEX_FLAGS_RE.match(source, end + 1)
+        if source[flags.end():flags.end() + 1].isalnum():
+            raise self.error("unsupported regexp options")
+        self.pos = flags.end()
+        return source[start:end] if opening != "/" else source[start - 1:flags.end()]
+
+class Parser:
+    """
+    Recursive descent over the tokens of a step definition file, printing each step body the way
+    parse.rb's Unparser.unparse does for the subset of Ruby it accepts. The output follows
+    unparser 0.6.13 with parser 3.3.1.0, the versions pinned in the Gemfile.lock.
+    """
+
+    def __init__(self, tokens: List[Token]):
+        self.tokens = tokens
+        self.pos = 0
+        # whether the current statement has a call without parentheses, e.g. expect(x).to eq(y)
+        self.command = False
+
+    def peek(self, offset: int=0) -> Optional[Token]:
+        index = self.pos + offset
+        return self.tokens[index] if index < len(self.tokens) else None
+
+    def next(self) -> Token:
+        token = self.peek()
+        if token is None:
+            raise UnsupportedSyntax("unexpected end of file")
+        self.pos += 1
+        return token
+
+    def error(self, message: str, token: Token=None):
+        token = token or self.peek()
+        return UnsupportedSyntax(message, token.line if token else None)
+
+    def at(self, kind: str, text: str=None, offset: int=0) -> bool:
+        token = self.peek(offset)
+        return token is not None and token.kind == kind and (text is None or token.text == text)
+
+    def at_keyword(self, *keywords: str) -> bool:
+        token = self.peek()
+        return token is not None and token.kind == "name" and token.text in keywords
+
+    def expect(self, kind: str, text: str=None) -> Token:
+        if not self.at(kind, text):
+            token = self.peek()
+            raise self.error(f"expected {text or kind}, found {token.text if token else 'end of file'!r}")
+        return self.next()
+
+    def end_of_line(self) -> None:
+        if self.peek() is not None:
+            self.expect("nl")
+
+    def skip_newlines(self) -> None:
+        while self.at("nl"):
+            self.pos += 1
+
+    def steps(self, file_path: str) -> Dict[str, dict]:
+        """Read the whole file, returning its {regex: {"Code", "File"}} step map."""
+        steps = {}
+        while True:
+            self.skip_newlines()
+            token = self.peek()
+            if token is None:
+                return steps
+            if token.kind == "name" and token.text in STEP_KEYWORDS:
+                regex, code = self.step_definition()
+                # like parse.rb, step definitions named by a string instead of a regexp are left out
+                if regex is not None:
+                    steps[regex] = {"Code": code, "File": file_path}
+            else:
+                self.plain_statement()
+
+    def plain_statement(self) -> None:
+        """Skip a one-line top-level statement, e.g. a require, that can't contain step definitions."""
+        depth = 0
+        while not self.at("nl") and self.peek() is not None:
+            token = self.next()
+            if token.kind == "name" and token.text in KEYWORDS and token.text not in LITERAL_KEYWORDS:
+                raise self.error(f"top-level {token.text}", token)
+            if token.kind == "op" and token.text in ("(", "["):
+                depth += 1
+            elif token.kind == "op" and token.text in (")", "]"):
+                depth -= 1
+            elif token.kind == "op" and token.text in ("{", "}", ";"):
+                raise self.error(f"top-level {token.text}", token)
+        if depth != 0:
+            raise self.error("top-level statement spans lines")
+
+    def step_definition(self) -> Tuple[Optional[str], str]:
+        """Read one Given/When/Then/And block, returning its regexp source and printed body."""
+        self.next()
+        parenthesized = self.at("op", "(") and not self.peek().spaced
+        if parenthesized:
+            self.next()
+        name = self.next()
+        if name.kind not in ("regex", "percent_regex", "string"):
+            raise self.error("step name is not a literal", name)
+        if parenthesized:
+            self.expect("op", ")")
+
+        regex = None
+        if name.kind == "percent_regex":
+            regex = name.text
+        elif name.kind == "regex":
+            regex = name.text[1:name.text.rindex("/")]
+
+        if self.at_keyword("do"):
+            self.next()
+            self.block_parameters()
+            self.end_of_line()
+            lines = self.body("end")
+            body = "\n".join("  " * depth + text for depth, text in lines)
+            return regex, f"do\n{body}\nend"
+
+        self.expect("op", "{")
+        self.block_parameters()
+        if not self.at("nl"):
+            code = self.statement_expression()
+            self.expect("op", "}")
+            self.end_of_line()
+            return regex, code
+        self.end_of_line()
+        lines = self.body("}")
+        if not lines:
+            raise self.error("empty block")
+        return regex, "\n".join("  " * depth + text for depth, text in lines)
+
+    def block_parameters(self) -> str:
+        """Read |a, b| block parameters, returning them as unparser prints them after the {."""
+        if not self.at("op", "|"):
+            if self.at("op", "||"):
+                raise self.error("empty block parameters")
+            return ""
+        self.next()
+        names = [self.expect("name").text]
+        while self.at("op", ","):
+            self.next()
+            if self.at("op", "|"):
+                break
+            names.append(self.expect("name").text)
+        self.expect("op", "|")
+        if any(not re.fullmatch(r"[a-z_][A-Za-z0-9_]*", name) or name in KEYWORDS for name in names):
+            raise self.error("unsupported block parameter")
+        # a lone block parameter is printed with a trailing comma
+        return " |" + ", ".join(names) + ("|" if len(names) > 1 else ",|")
+
+    def body(self, closing: str) -> List[Tuple[int, str]]:
+        """
+        Read statements up to the end or } closing the step block.
+
+        Returns:
+            list: (depth, text) for each printed line, depth counting the enclosing ifs and blocks.
+        """
+        lines = []
+        # each open construct is [kind, number of statements in its current branch]
+        stack = []
+
+        def add(text):
+            if stack:
+                stack[-1][1] += 1
+            lines.append((len(stack), text))
+
+        while True:
+            self.skip_newlines()
+            token = self.peek()
+            if token is None:
+                raise self.error("unterminated block")
+
+            if (token.kind, token.text) in (("name", "end"), ("op", "}")):
+                self.next()
+                self.end_of_line()
+                if not stack:
+                    if token.text != closing:
+                        raise self.error(f"{token.text} closing a {closing} block", token)
+                    return lines
+                kind, count = stack.pop()
+                if count == 0 or (kind == "brace") != (token.text == "}"):
+                    raise self.error("empty or mismatched construct", token)
+                add("}" if kind in ("do", "brace") else "end")
+            elif token.kind == "name" and token.text == "else":
+                self.next()
+                self.end_of_line()
+                if not stack or stack[-1][0] != "if" or stack[-1][1] == 0:
+                    raise self.error("unsupported else", token)
+                stack[-1] = ["else", 0]
+                lines.append((len(stack) - 1, "else"))
+            elif token.kind == "name" and token.text in ("if", "unless"):
+                self.next()
+                add(f"{token.text} {self.expression()}")
+                self.end_of_line()
+                stack.append([token.text, 0])
+            elif token.kind == "name" and token.text in JUMP_KEYWORDS:
+                self.next()
+                self.end_of_line()
+                add(token.text)
+            else:
+                text, opened, modifier = self.statement()
+                if modifier is not None:
+                    # unparser prints "x if y" as a full if statement
+                    add(modifier)
+                    lines.append((len(stack) + 1, text))
+                    add("end")
+                else:
+                    add(text)
+                if opened is not None:
+                    stack.append([opened, 0])
+
+    def statement(self) -> Tuple[str, Optional[str], Optional[str]]:
+        """
+        Read one statement line.
+
+        Returns:
+            tuple: The printed line, the kind of construct it opens ("if", "do" or "brace") or None,
+                   and the "if ..." or "unless ..." of a trailing modifier or None.
+        """
+        self.command = False
+        target = self.peek()
+        if target.kind == "name" and target.text not in KEYWORDS and self.at("op", offset=1) and self.peek(1).text in ASSIGNMENT_OPERATORS:
+            self.next()
+            operator = self.next().text
+            if operator == "=" and self.at_keyword("if"):
+                self.next()
+                text = f"{target.text} = if {self.expression()}"
+                self.end_of_line()
+                return text, "if", None
+            text = f"{target.text} {operator} {self.expression(command=True)}"
+            if self.at_keyword("rescue") and not self.command:
+                self.next()
+                text += f" rescue {self.expression()}"
+        else:
+            text = self.expression(command=True)
+
+        opened = None
+        if self.at_keyword("do") or (self.at("op", "{") and self.peek().spaced):
+            if self.command and not self.at_keyword("do"):
+                raise self.error("brace block after a call without parentheses")
+            # the block has to belong to the call the line ends with
+            last = self.tokens[self.pos - 1]
+            if not (last.kind == "name" and last.text not in KEYWORDS) and not (last.kind == "op" and last.text == ")"):
+                raise self.error("block on a non-call")
+            opened = "do" if self.next().text == "do" else "brace"
+            text += " {" + self.block_parameters()
+
+        modifier = None
+        if opened is None and self.at_keyword("if", "unless"):
+            keyword = self.next().text
+            modifier = f"{keyword} {self.expression()}"
+        self.end_of_line()
+        return text, opened, modifier
+
+    def statement_expression(self) -> str:
+        """Read the single expression of a one-line { ... } step block."""
+        text = self.expression(command=True)
+        if not self.at("op", "}"):
+            raise self.error("unsupported one-line block")
+        return text
+
+    def expression(self, command: bool=False) -> str:
+        """
+        Read a chain of unary expressions joined by binary operators of one precedence level.
+
+        Args:
+            command (bool): Allow a call without parentheses, which takes the rest of the line as its arguments.
+        """
+        parts = [self.unary(command)]
+        if self.command and command:
+            return parts[0]
+        level = None
+        while self.at("op") and self.peek().text in BINARY_OPERATORS:
+            operator = self.next()
+            following = self.peek()
+            if following is None or following.spaced != operator.spaced:
+                raise self.error("ambiguous operator spacing", operator)
+            operator_level = BINARY_OPERATORS[operator.text]
+            if (level is not None and level != operator_level) or (level in NON_ASSOCIATIVE):
+                raise self.error("mixed operator precedence", operator)
+            level = operator_level
+            parts.append(operator.text)
+            parts.append(self.unary())
+        return " ".join(parts)
+
+    def unary(self, command: bool=False) -> str:
+        if self.at("op", "!"):
+            self.next()
+            return "!" + self.unary()
+        if self.at("op", "-") and self.at("number", offset=1) and not self.peek(1).spaced:
+            self.next()
+            return "-" + self.next().text
+        return self.primary(command)
+
+    def primary(self, command: bool=False) -> str:
+        """Read an operand and its trailing method calls and index lookups."""
+        token = self.next()
+        if token.kind == "name":
+            if token.text in KEYWORDS:
+                if token.text not in LITERAL_KEYWORDS:
+                    raise self.error(f"unsupported {token.text}", token)
+                text = token.text
+            else:
+                text = token.text + self.call_arguments()
+                if command and text == token.text and self.at_command_argument():
+                    return text + self.command_arguments()
+        elif token.kind in ("number", "string", "symbol", "regex", "words"):
+            text = token.text
+        elif token.kind == "op" and token.text == "[":
+            text = "[" + ", ".join(self.sequence("]")) + "]"
+        elif token.kind == "op" and token.text == "{":
+            pairs = self.sequence("}", pairs_only=True)
+            text = "{ " + ", ".join(pairs) + " }" if pairs else "{}"
+        else:
+            raise self.error(f"unexpected {token.text!r}", token)
+
+        while True:
+            if self.at("op") and self.peek().text in (".", "&.", "::"):
+                operator = self.next()
+                name = self.expect("name")
+                if operator.text == "::" and not name.text[0].isupper():
+                    raise self.error("method call with ::", name)
+                arguments = self.call_arguments()
+                text += operator.text + name.text + arguments
+                if command and not arguments and self.at_command_argument():
+                    return text + self.command_arguments()
+            elif self.at("op", "[") and not self.peek().spaced:
+                self.next()
+                arguments = self.sequence("]")
+                if not arguments:
+                    raise self.error("empty index")
+                # unparser prints index lookups as calls to []
+                text += ".[](" + ", ".join(arguments) + ")"
+            else:
+                return text
+
+    def at_command_argument(self) -> bool:
+        """Check whether a spaced operand follows a method name, making it a call without parentheses."""
+        token = self.peek()
+        if token is None or not token.spaced:
+            return False
+        if token.kind == "name":
+            return token.text not in KEYWORDS or token.text in LITERAL_KEYWORDS
+        return token.kind in ("string", "symbol", "number", "regex", "words", "label")
+
+    def command_arguments(self) -> str:
+        """Read the arguments of a call without parentheses, which unparser prints with them."""
+        self.command = True
+        return "(" + ", ".join(self.sequence(None)) + ")"
+
+    def call_arguments(self) -> str:
+        """Read a parenthesized argument list, with trailing keyword arguments printed as a hash."""
+        if not self.at("op", "(") or self.peek().spaced:
+            return ""
+        self.next()
+        arguments = self.sequence(")")
+        if not arguments:
+            raise self.error("empty argument list")
+        return "(" + ", ".join(arguments) + ")"
+
+    def sequence(self, closing: Optional[str], pairs_only: bool=False) -> List[str]:
+        """
+        Read comma separated items up to the closing bracket, or to the end of the arguments of a
+        call without parentheses if closing is None.
+
+        Hash pairs (label: value or "string" => value) must come last and are gathered into one
+        { ... } item, or returned as the items themselves when pairs_only is set.
+        """
+        command = closing is None
+        items = []
+        pairs = []
+        while command or not self.at("op", closing):
+            if self.at("label"):
+                label = self.next().text
+                pairs.append(f"{label} {self.expression(command)}")
+            else:
+                key = self.peek()
+                item = self.expression(command)
+                if self.at("op", "=>"):
+                    if key.kind != "string" or self.tokens[self.pos - 1] is not key:
+                        raise self.error("unsupported hash key", key)
+                    self.next()
+                    pairs.append(f"{item} => {self.expression(command)}")
+                elif pairs or pairs_only or closing == "}":
+                    raise self.error("unsupported hash item", key)
+                else:
+                    items.append(item)
+            if not self.at("op", ","):
+                break
+            self.next()
+            if self.at("nl"):
+                raise self.error("multi-line argument list")
+        if not command:
+            self.expect("op", closing)
+
+        if pairs_only:
+            return pairs
+        if pairs:
+            if closing == "]":
+                raise self.error("hash pairs in an array")
+            items.append("{ " + ", ".join(pairs) + " }")
+        return items
+
+def canonical_expression(tokens: List[Token], line: int) -> str:
+    """Print the code of an interpolation, which must be a single expression."""
+    parser = Parser(tokens)
+    if not tokens:
+        raise UnsupportedSyntax("empty interpolation", line)
+    text = parser.expression()
+    if parser.peek() is not None:
+        raise UnsupportedSyntax("unsupported interpolation", line)
+    return text
+
+def extract_step_definitions(source: str, file_path: str) -> Dict[str, dict]:
+    """
+    Extract the step definitions of a Ruby file without running Ruby.
+
+    Args:
+        source (str): The contents of the file.
+        file_path (str): The path stored as each step's "File", as parse.rb does.
+
+    Returns:
+        dict: {regex: {"Code", "File"}}, identical to what parse.rb produces for the file.
+
+    Raises:
+        UnsupportedSyntax: If the file uses anything outside the subset of Ruby the tokenizer can
+                           print exactly like unparser, in which case it should be parsed with parse.rb.
+    """
+    tokens = Lexer(source.replace("\r\n", "\n")).tokenize()
+    return Parser(tokens).steps(file_path)
+
+def tokenize_step_definitions(file_path: str) -> Tuple[Optional[Dict[str, dict]], Optional[str]]:
+    """
+    Read and extract the step definitions of a file on the fast path.
+
+    Returns:
+        tuple: The step map and None, or None and the reason the file has to be parsed with parse.rb.
+    """
+    try:
+        with open(file_path, encoding='utf-8') as f:
+            source = f.read()
+        return extract_step_definitions(source, file_path), None
+    except (OSError, UnicodeDecodeError, UnsupportedSyntax) as e:
+        return None, str(e)
+
+if __name__ == "__main__":
+    import argparse
+    from step_finder import find_step_definition_files
+
+    parser = argparse.ArgumentParser(description='Report which Ruby step definition files the tokenizer fast path can extract.')
+    parser.add_argument('directory', type=str, help='Directory containing Ruby files')
+    parser.add_argument('--file-type', type=str, default='.rb', help='File type of Ruby files (default: .rb)')
+    args = parser.parse_args()
+
+    fast_path_files = 0
+    step_definition_files = find_step_definition_files(args.directory, args.file_type, quiet=True)
+    for file_path in step_definition_files:
+        steps, reason = tokenize_step_definitions(file_path)
+        if steps is None:
+            print(f"parse.rb  {file_path}: {reason}")
+        else:
+            fast_path_files += 1
+            print(f"fast path {file_path}: {len(steps)} step definitions")
+    print(f"\nFast Path Files: {fast_path_files}")
+    print(f"Ruby Parser Files: {len(step_definition_files) - fast_path_files}")
@@ -0,0 +1,37 @@
+import re
+import pytest
+from step_matcher import StepMatcher, literal_prefix, required_literals
+
+def scan(step_patterns, step_name):
+    """The dictionary-order re.match scan StepMatcher must agree with."""
+    for pattern, definition in step_patterns.items():
+        if re.match(pattern, step_name):
+            return definition
+    return None
+
+@pytest.mark.parametrize("pattern, prefix, literals", [
+    (r'^\x41BC$', "ABC", ("ABC",)),
+    (r'^ABC$', "ABC", ("ABC",)),
+    (r'^\U00000041BC$', "ABC", ("ABC",)),
+    (r'^\N{LATIN CAPITAL LETTER A}BC$', "ABC", ("ABC",)),
+    (r'^\101BC$', "ABC", ("ABC",)),
+    (r'^\0101$', "\x081", ("\x081",)),
+    (r'^(A)\1BC$', "", ("BC",)),
+    (r'^a\d+bc$', "a", ("bc",)),
+])
+def test_escapes_are_consumed_whole(pattern, prefix, literals):
+    assert literal_prefix(pattern) == prefix
+    assert required_literals(pattern) == literals
+
+@pytest.mark.parametrize("step_name", ["ABC", "A1BC", "AABC", "x ABC"])
+def test_escaped_literals_keep_first_match(step_name):
+    step_patterns = {
+        r'^\x41BC': {"Code": "hex"},
+        r'^ABC': {"Code": "unicode"},
+        r'^\101BC': {"Code": "octal"},
+        r'^(A)\1BC': {"Code": "backreference"},
+        r'^A': {"Code": "fallback"},
+        r'.*ABC': {"Code": "anywhere"},
+    }
+    matcher = StepMatcher(step_patterns)
+    assert matcher.search(step_name) == scan(step_patterns, step_name)
@@ -0,0 +1,29 @@
+import os
+import glob
+import json
+import pytest
+from step_tokenizer import UnsupportedSyntax, extract_step_definitions
+
+# Step definition sources with the "Code" parse.rb (unparser 0.6.13) printed for them:
+#   jekyll.json     jekyll's step definitions as written
+#   roundtrip.json  the parse.rb output of jekyll, trema and aws-sdk-ruby fed back in as source
+# "accepted" records whether the tokenizer handled the case when the fixture was made.
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "tokenizer")
+
+def fixture_cases():
+    cases = []
+    for fixture in sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.json"))):
+        name = os.path.splitext(os.path.basename(fixture))[0]
+        with open(fixture, encoding="utf-8") as f:
+            cases.extend(pytest.param(case, id=f"{name}-{index}") for index, case in enumerate(json.load(f)))
+    return cases
+
+@pytest.mark.parametrize("case", fixture_cases())
+def test_matches_parse_rb(case):
+    try:
+        steps = extract_step_definitions(case["source"], "steps.rb")
+    except UnsupportedSyntax as e:
+        # declining only sends the file to parse.rb, but an accepted case must stay on the fast path
+        assert not case["accepted"], f"no longer accepted: {e}"
+        return
+    assert steps == {case["pattern"]: {"Code": case["code"], "File": "steps.rb"}}